@@ -1,13 +1,13 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import json
 import asyncio
-from typing import Dict, List
+from typing import Dict, List, Optional
+from datetime import datetime
 import logging
-from services.simulation_service import SimulationService
-from services.conflict_detection_service import ConflictDetectionService
-from services.websocket_manager import WebSocketManager
+from services.session_service import SessionManager, SimulationSession, DEFAULT_SESSION_ID
+from services.graph_service import MIN_POINTS, MAX_POINTS, MIN_COLUMNS, MAX_COLUMNS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,25 +24,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-websocket_manager = WebSocketManager()
-simulation_service = SimulationService()
-conflict_service = ConflictDetectionService()
+# Initialize services: the default session backs the original single-simulation API
+session_manager = SessionManager()
+default_session = session_manager.create_session(DEFAULT_SESSION_ID, pinned=True)
+websocket_manager = default_session.websocket_manager
+simulation_service = default_session.simulation_service
 
-# Connect services
-simulation_service.set_websocket_manager(websocket_manager)
+def charged_session(session_id: str) -> SimulationSession:
+    """Look up a session for CPU-heavy work, refusing it once the session's CPU budget is spent"""
+    session = get_session(session_id)
+    if session.simulation_service.cpu_budget_exhausted():
+        raise HTTPException(status_code=429, detail=f"CPU budget of session {session_id} is used up")
+    return session
+
+def get_session(session_id: str) -> SimulationSession:
+    """Look up a session, raising 404 if it does not exist"""
+    session = session_manager.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup"""
     logger.info("Starting AI-Powered Train Traffic Control API")
-    await simulation_service.initialize()
+    await session_manager.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     logger.info("Shutting down services")
-    await simulation_service.cleanup()
+    await session_manager.cleanup()
 
 @app.get("/")
 async def root():
@@ -54,14 +66,50 @@ async def get_status():
     return {
         "status": "online",
         "simulation_running": simulation_service.is_running(),
-        "connected_clients": len(websocket_manager.active_connections)
+        "connected_clients": len(websocket_manager.active_connections),
+        "sessions": len(session_manager.sessions)
     }
 
+@app.get("/api/sessions")
+async def list_sessions():
+    """List all simulation sessions"""
+    return {"sessions": session_manager.list_sessions()}
+
+@app.post("/api/sessions")
+async def create_session():
+    """Create an isolated simulation session"""
+    try:
+        session = await session_manager.open_session()
+        return {"success": True, "data": session.to_dict()}
+    except Exception as e:
+        logger.error(f"Error creating session: {e}")
+        return {"success": False, "error": str(e)}
+
+@app.delete("/api/sessions/{session_id}")
+async def close_session(session_id: str):
+    """Stop and remove a simulation session"""
+    if session_id == DEFAULT_SESSION_ID:
+        return {"success": False, "error": "The default session cannot be closed"}
+    if not await session_manager.close_session(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"success": True, "message": f"Session {session_id} closed"}
+
+@app.get("/api/sessions/{session_id}")
+async def get_session_status(session_id: str):
+    """Get the status and resource usage of a session"""
+    return get_session(session_id).to_dict()
+
 @app.post("/api/simulation/start")
 async def start_simulation():
     """Start the simulation"""
+    return await start_session_simulation(DEFAULT_SESSION_ID)
+
+@app.post("/api/sessions/{session_id}/simulation/start")
+async def start_session_simulation(session_id: str):
+    """Start a session's simulation"""
+    session = get_session(session_id)
     try:
-        result = await simulation_service.start_simulation()
+        result = await session.simulation_service.start_simulation()
         return {"success": True, "message": "Simulation started", "data": result}
     except Exception as e:
         logger.error(f"Error starting simulation: {e}")
@@ -70,19 +118,90 @@ async def start_simulation():
 @app.post("/api/simulation/stop")
 async def stop_simulation():
     """Stop the simulation"""
+    return await stop_session_simulation(DEFAULT_SESSION_ID)
+
+@app.post("/api/sessions/{session_id}/simulation/stop")
+async def stop_session_simulation(session_id: str):
+    """Stop a session's simulation"""
+    session = get_session(session_id)
     try:
-        await simulation_service.stop_simulation()
+        await session.simulation_service.stop_simulation()
         return {"success": True, "message": "Simulation stopped"}
     except Exception as e:
         logger.error(f"Error stopping simulation: {e}")
         return {"success": False, "error": str(e)}
 
+@app.get("/api/occupancy")
+async def get_occupancy():
+    """Get the current occupant of every block section"""
+    return await get_session_occupancy(DEFAULT_SESSION_ID)
+
+@app.get("/api/sessions/{session_id}/occupancy")
+async def get_session_occupancy(session_id: str):
+    """Get the current occupant of every block section in a session"""
+    session = get_session(session_id)
+    current_time = session.simulation_service.current_time
+    with session.charge():
+        blocks = session.occupancy_service.get_occupancy_snapshot(current_time)
+    return {"current_time": current_time.isoformat(), "blocks": blocks}
+
+@app.get("/api/routes")
+async def get_routes(origin: str, destination: str, k: int = Query(3, ge=1)):
+    """Get up to k alternative routes between two sections at the current simulation time"""
+    return await get_session_routes(DEFAULT_SESSION_ID, origin, destination, k)
+
+@app.get("/api/sessions/{session_id}/routes")
+async def get_session_routes(session_id: str, origin: str, destination: str, k: int = Query(3, ge=1)):
+    """Get up to k alternative routes between two sections in a session"""
+    session = charged_session(session_id)
+    with session.charge():
+        routes = session.routing_service.get_routes(origin, destination, session.simulation_service.current_time, k)
+        return {"routes": [route.to_dict() for route in routes]}
+
+@app.get("/api/graphs/time-distance")
+async def get_time_distance_graph(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                  max_points: int = Query(500, ge=MIN_POINTS, le=MAX_POINTS),
+                                  train_id: Optional[str] = None):
+    """Get downsampled time-distance series for a time window"""
+    return await get_session_time_distance_graph(DEFAULT_SESSION_ID, start, end, max_points, train_id)
+
+@app.get("/api/sessions/{session_id}/graphs/time-distance")
+async def get_session_time_distance_graph(session_id: str, start: Optional[datetime] = None,
+                                          end: Optional[datetime] = None,
+                                          max_points: int = Query(500, ge=MIN_POINTS, le=MAX_POINTS),
+                                          train_id: Optional[str] = None):
+    """Get downsampled time-distance series for a time window in a session"""
+    session = charged_session(session_id)
+    with session.charge():
+        return session.graph_service.get_time_distance(start, end, max_points, train_id)
+
+@app.get("/api/graphs/occupancy")
+async def get_occupancy_graph(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                              max_columns: int = Query(200, ge=MIN_COLUMNS, le=MAX_COLUMNS)):
+    """Get the section occupancy matrix for a time window"""
+    return await get_session_occupancy_graph(DEFAULT_SESSION_ID, start, end, max_columns)
+
+@app.get("/api/sessions/{session_id}/graphs/occupancy")
+async def get_session_occupancy_graph(session_id: str, start: Optional[datetime] = None,
+                                      end: Optional[datetime] = None,
+                                      max_columns: int = Query(200, ge=MIN_COLUMNS, le=MAX_COLUMNS)):
+    """Get the section occupancy matrix for a time window in a session"""
+    session = charged_session(session_id)
+    with session.charge():
+        return session.graph_service.get_occupancy(start, end, max_columns)
+
 @app.post("/api/resolution/accept")
 async def accept_resolution(resolution_data: dict):
     """Accept the AI's proposed resolution"""
+    return await accept_session_resolution(DEFAULT_SESSION_ID, resolution_data)
+
+@app.post("/api/sessions/{session_id}/resolution/accept")
+async def accept_session_resolution(session_id: str, resolution_data: dict):
+    """Accept the AI's proposed resolution in a session"""
+    session = get_session(session_id)
     try:
-        result = await simulation_service.apply_resolution(resolution_data)
-        await websocket_manager.broadcast({
+        result = await session.simulation_service.apply_resolution(resolution_data)
+        await session.websocket_manager.broadcast({
             "type": "resolution_accepted",
             "data": result
         })
@@ -94,8 +213,14 @@ async def accept_resolution(resolution_data: dict):
 @app.post("/api/resolution/reject")
 async def reject_resolution():
     """Reject the AI's proposed resolution"""
+    return await reject_session_resolution(DEFAULT_SESSION_ID)
+
+@app.post("/api/sessions/{session_id}/resolution/reject")
+async def reject_session_resolution(session_id: str):
+    """Reject the AI's proposed resolution in a session"""
+    session = get_session(session_id)
     try:
-        await websocket_manager.broadcast({
+        await session.websocket_manager.broadcast({
             "type": "resolution_rejected",
             "data": {"message": "Resolution rejected by controller"}
         })
@@ -104,30 +229,101 @@ async def reject_resolution():
         logger.error(f"Error rejecting resolution: {e}")
         return {"success": False, "error": str(e)}
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time communication"""
-    await websocket_manager.connect(websocket)
+def parse_graph_request(message: Dict) -> Dict:
+    """Validate the window and size fields of a graph request, raising ValueError on bad input"""
+    params = {}
+    for field in ("start", "end"):
+        value = message.get(field)
+        if value is None:
+            params[field] = None
+        elif isinstance(value, str):
+            try:
+                params[field] = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"'{field}' must be an ISO 8601 timestamp")
+        else:
+            raise ValueError(f"'{field}' must be an ISO 8601 timestamp")
+
+    size_field, low, high = (
+        ("max_points", MIN_POINTS, MAX_POINTS) if message["type"] == "request_time_distance"
+        else ("max_columns", MIN_COLUMNS, MAX_COLUMNS)
+    )
+    size = message.get(size_field)
+    if size is not None and (not isinstance(size, int) or isinstance(size, bool) or not low <= size <= high):
+        raise ValueError(f"'{size_field}' must be an integer between {low} and {high}")
+    params[size_field] = size
+
+    train_id = message.get("train_id")
+    if train_id is not None and not isinstance(train_id, str):
+        raise ValueError("'train_id' must be a string")
+    if message["type"] == "request_time_distance":
+        params["train_id"] = train_id
+    return params
+
+async def handle_websocket(websocket: WebSocket, session: SimulationSession):
+    """Serve one client on a session's WebSocket channel"""
+    await session.websocket_manager.connect(websocket)
     try:
         while True:
             # Keep connection alive and handle incoming messages
             data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            if message.get("type") == "ping":
-                await websocket.send_text(json.dumps({"type": "pong"}))
-            elif message.get("type") == "request_status":
-                status = await get_status()
+            session.touch()
+            try:
+                message = json.loads(data)
+                if not isinstance(message, dict):
+                    raise ValueError("Message must be a JSON object")
+                if (message.get("type") in ("request_time_distance", "request_occupancy")
+                        and session.simulation_service.cpu_budget_exhausted()):
+                    raise ValueError(f"CPU budget of session {session.id} is used up")
+                
+                if message.get("type") == "ping":
+                    await websocket.send_text(json.dumps({"type": "pong"}))
+                elif message.get("type") == "request_status":
+                    status = await get_status() if session.id == DEFAULT_SESSION_ID else session.to_dict()
+                    await websocket.send_text(json.dumps({
+                        "type": "status_update",
+                        "data": status
+                    }))
+                elif message.get("type") == "request_time_distance":
+                    params = parse_graph_request(message)
+                    with session.charge():
+                        data = session.graph_service.get_time_distance(**params)
+                    await websocket.send_text(json.dumps({"type": "time_distance_data", "data": data}))
+                elif message.get("type") == "request_occupancy":
+                    params = parse_graph_request(message)
+                    with session.charge():
+                        data = session.graph_service.get_occupancy(**params)
+                    await websocket.send_text(json.dumps({"type": "occupancy_data", "data": data}))
+            except ValueError as e:
+                # Malformed requests get an error reply instead of dropping the client
                 await websocket.send_text(json.dumps({
-                    "type": "status_update",
-                    "data": status
+                    "type": "error",
+                    "data": {"message": str(e)}
                 }))
                 
     except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket)
+        session.websocket_manager.disconnect(websocket)
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        websocket_manager.disconnect(websocket)
+        session.websocket_manager.disconnect(websocket)
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    """WebSocket endpoint for real-time communication"""
+    await handle_websocket(websocket, default_session)
+
+@app.websocket("/ws/sessions/{session_id}")
+async def session_websocket_endpoint(websocket: WebSocket, session_id: str):
+    """WebSocket channel of a single session"""
+    session = session_manager.get_session(session_id)
+    if not session:
+        await websocket.close(code=4404)
+        return
+    await handle_websocket(websocket, session)
 
 if __name__ == "__main__":
     import uvicorn
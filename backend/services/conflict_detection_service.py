@@ -18,6 +18,15 @@ class Conflict:
     def __str__(self):
         return f"Conflict between {self.train1_id} and {self.train2_id} at {self.location} at {self.time}"
 
+    def to_dict(self) -> Dict:
+        return {
+            "train1_id": self.train1_id,
+            "train2_id": self.train2_id,
+            "location": self.location,
+            "time": self.time.isoformat(),
+            "conflict_type": self.conflict_type
+        }
+
 class Resolution:
     def __init__(self, conflict: Conflict, solution_type: str, details: Dict):
         self.conflict = conflict
@@ -30,14 +39,27 @@ class ConflictDetectionService:
         self.prediction_horizon = 30  # minutes
         self.conflicts: List[Conflict] = []
         self.resolutions: List[Resolution] = []
+        self.occupancy_service = None
+        self.routing_service = None
+        self.delay_predictor = None
         
     async def detect_conflicts(self, trains: Dict, network_data: Dict, current_time: datetime) -> List[Conflict]:
         """Detect potential conflicts between trains"""
+        return self.find_conflicts(trains, network_data, current_time)
+
+    def find_conflicts(self, trains: Dict, network_data: Dict, current_time: datetime) -> List[Conflict]:
+        """Synchronous conflict detection, so callers can time it without other tasks interleaving"""
         conflicts = []
         
         # Get predicted positions for all trains
         predictions = self.predict_train_positions(trains, current_time)
         
+        if self.occupancy_service and self.occupancy_service.blocks:
+            conflicts = self.detect_block_conflicts(trains, predictions, current_time)
+            self.conflicts = conflicts
+            logger.debug(f"Detected {len(conflicts)} potential conflicts")
+            return conflicts
+        
         # Check for conflicts between each pair of trains
         train_ids = list(trains.keys())
         for i in range(len(train_ids)):
@@ -53,11 +75,32 @@ class ConflictDetectionService:
                     conflicts.append(conflict)
         
         self.conflicts = conflicts
-        logger.info(f"Detected {len(conflicts)} potential conflicts")
+        logger.debug(f"Detected {len(conflicts)} potential conflicts")
+        return conflicts
+    
+    def detect_block_conflicts(self, trains: Dict, predictions: Dict, current_time: datetime) -> List[Conflict]:
+        """Detect conflicts by booking current and predicted occupations into the block reservation tables"""
+        conflicts = []
+        clashes = self.occupancy_service.find_predicted_conflicts(trains, predictions, current_time)
+        for blocking_id, train_id, location, time in clashes:
+            same_direction = (
+                self.occupancy_service.direction(trains[blocking_id].route, location)
+                == self.occupancy_service.direction(trains[train_id].route, location)
+            )
+            conflicts.append(Conflict(
+                train1_id=blocking_id,
+                train2_id=train_id,
+                location=location,
+                time=time,
+                conflict_type="overtaking" if same_direction else "head_on"
+            ))
         return conflicts
     
     def predict_train_positions(self, trains: Dict, current_time: datetime) -> Dict:
         """Predict future positions of all trains"""
+        if self.delay_predictor:
+            return self.delay_predictor.predict_batch(trains, current_time)
+        
         predictions = {}
         
         for train_id, train in trains.items():
@@ -159,22 +202,15 @@ class ConflictDetectionService:
             delayed_train = conflict.train1_id
             priority_train = conflict.train2_id
         
-        # Check if rerouting is possible (loop line available)
-        section_info = self.get_section_info(conflict.location, network_data)
-        if section_info and "loop" in section_info.get("tracks", []):
-            # Reroute to loop line
+        # Check if rerouting is possible (alternative path or loop line available)
+        reroute = self.get_reroute_details(delayed_train, conflict, trains, network_data)
+        if reroute:
             solution = Resolution(
                 conflict=conflict,
                 solution_type="reroute",
-                details={
-                    "rerouted_train": delayed_train,
-                    "from_track": "main",
-                    "to_track": "loop",
-                    "location": conflict.location,
-                    "estimated_delay": 2  # 2 minute delay for rerouting
-                }
+                details=reroute
             )
-            solution.cost = 2
+            solution.cost = reroute["estimated_delay"]
         else:
             # Delay the train
             delay_minutes = 10  # Default delay
@@ -247,27 +283,29 @@ class ConflictDetectionService:
             neighbor.details["delay_minutes"] = new_delay
             neighbor.cost = new_delay
             
-        elif current_solution.solution_type == "reroute":
+        elif current_solution.solution_type == "reroute" and "route" not in current_solution.details:
             # Vary estimated delay for rerouting
             current_delay = current_solution.details["estimated_delay"]
             new_delay = max(1, current_delay + random.randint(-1, 2))
             neighbor.details["estimated_delay"] = new_delay
             neighbor.cost = new_delay
+            
+        elif current_solution.solution_type == "reroute":
+            # Path reroutes carry a computed delay that is not varied
+            neighbor.cost = current_solution.details["estimated_delay"]
         
         # Small chance to completely change solution type
         if random.random() < 0.1:
-            section_info = self.get_section_info(conflict.location, network_data)
-            if current_solution.solution_type == "delay" and section_info and "loop" in section_info.get("tracks", []):
+            reroute = None
+            if current_solution.solution_type == "delay":
+                reroute = self.get_reroute_details(
+                    current_solution.details["delayed_train"], conflict, trains, network_data
+                )
+            if reroute:
                 # Change from delay to reroute
                 neighbor.solution_type = "reroute"
-                neighbor.details = {
-                    "rerouted_train": current_solution.details["delayed_train"],
-                    "from_track": "main",
-                    "to_track": "loop",
-                    "location": conflict.location,
-                    "estimated_delay": 2
-                }
-                neighbor.cost = 2
+                neighbor.details = reroute
+                neighbor.cost = reroute["estimated_delay"]
             elif current_solution.solution_type == "reroute":
                 # Change from reroute to delay
                 neighbor.solution_type = "delay"
@@ -280,6 +318,37 @@ class ConflictDetectionService:
         
         return neighbor
     
+    def get_reroute_details(self, train_id: str, conflict: Conflict, trains: Dict,
+                            network_data: Dict) -> Optional[Dict]:
+        """Find a reroute for a train: an alternative path avoiding the conflict, else the loop line"""
+        train = trains[train_id]
+        if self.routing_service and train.current_section:
+            alternative = self.routing_service.find_alternative_route(
+                train.route, train.current_section, conflict.location, conflict.time
+            )
+            if alternative:
+                remaining = train.route[train.current_position:]
+                planned = self.routing_service.evaluate_route(remaining, conflict.time)
+                return {
+                    "rerouted_train": train_id,
+                    "original_route": remaining,
+                    "route": alternative.sections,
+                    "location": conflict.location,
+                    "estimated_delay": max(0, round(alternative.travel_minutes - planned.travel_minutes))
+                }
+
+        section_info = self.get_section_info(conflict.location, network_data)
+        if section_info and "loop" in section_info.get("tracks", []):
+            # Reroute to loop line
+            return {
+                "rerouted_train": train_id,
+                "from_track": "main",
+                "to_track": "loop",
+                "location": conflict.location,
+                "estimated_delay": 2  # 2 minute delay for rerouting
+            }
+        return None
+    
     def calculate_solution_cost(self, solution: Resolution) -> float:
         """Calculate the total cost of a solution"""
         if solution.solution_type == "delay":
@@ -298,3 +367,15 @@ class ConflictDetectionService:
             return resolution.details["estimated_delay"] >= 0
         
         return True
+
+    def set_occupancy_service(self, occupancy_service):
+        """Set the block occupancy engine used as ground truth for detection"""
+        self.occupancy_service = occupancy_service
+
+    def set_routing_service(self, routing_service):
+        """Set the routing engine used to find alternative paths for reroutes"""
+        self.routing_service = routing_service
+
+    def set_delay_predictor(self, delay_predictor):
+        """Set the batched delay predictor used for future train positions"""
+        self.delay_predictor = delay_predictor
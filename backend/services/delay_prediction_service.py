@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple, Optional
+import numpy as np
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+def scheduled_time(value: str, current_time: datetime) -> datetime:
+    """Convert an HH:MM timetable entry to a datetime on the simulation day"""
+    parsed = datetime.strptime(value, "%H:%M")
+    return current_time.replace(hour=parsed.hour, minute=parsed.minute, second=0, microsecond=0)
+
+class DelayPredictor(ABC):
+    """Interface for predictors that score the whole fleet in one call per tick"""
+
+    @abstractmethod
+    def predict_batch(self, trains: Dict, current_time: datetime) -> Dict[str, List[Tuple[str, datetime]]]:
+        """Return the predicted future (section, arrival) pairs of every train"""
+
+class AdditiveDelayPredictor(DelayPredictor):
+    """Original rule: the current delay is carried unchanged to every future stop"""
+
+    def predict_batch(self, trains: Dict, current_time: datetime) -> Dict[str, List[Tuple[str, datetime]]]:
+        predictions = {}
+        for train_id, train in trains.items():
+            predictions[train_id] = []
+            for section in train.route:
+                if section in train.schedule:
+                    arrival = scheduled_time(train.schedule[section]["arrival"], current_time)
+                    predicted_arrival = arrival + timedelta(minutes=train.delay)
+                    if predicted_arrival > current_time:
+                        predictions[train_id].append((section, predicted_arrival))
+        return predictions
+
+class LinearDelayPredictor(DelayPredictor):
+    """Linear model of the delay at each future stop, trained offline.
+
+    Features account for schedule slack (recovery time) and how many other
+    trains are timetabled through the same section around the same time
+    (congestion). Predictions are cached per train and only recomputed when
+    that train's state changes.
+    """
+
+    FEATURES = ["bias", "current_delay", "recovery_minutes", "congestion", "stops_ahead"]
+
+    def __init__(self, weights: Optional[List[float]] = None, occupancy_service=None):
+        self.weights = np.array(weights, dtype=float) if weights is not None else None
+        self.occupancy_service = occupancy_service
+        self.fallback = AdditiveDelayPredictor()
+        self.min_dwell = 1  # minutes
+        self.congestion_window = 15  # minutes
+        # train_id -> (state key, [(section, predicted arrival)])
+        self.cache: Dict[str, Tuple[Tuple, List[Tuple[str, datetime]]]] = {}
+        self.congestion: Dict[Tuple[str, str], int] = {}
+        self.fleet_key: Optional[frozenset] = None
+
+    @classmethod
+    def load(cls, path: str, occupancy_service=None) -> "LinearDelayPredictor":
+        """Load trained weights, falling back to the additive rule if the model is missing"""
+        try:
+            with open(path, "r") as f:
+                model = json.load(f)
+            if model.get("features") != cls.FEATURES:
+                raise ValueError(f"Model features {model.get('features')} do not match {cls.FEATURES}")
+            logger.info(f"Loaded delay model from {path}")
+            return cls(model["weights"], occupancy_service)
+        except FileNotFoundError:
+            logger.warning(f"Delay model not found at {path}, using additive delay rule")
+        except Exception as e:
+            logger.error(f"Error loading delay model: {e}")
+        return cls(None, occupancy_service)
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({"features": self.FEATURES, "weights": self.weights.tolist()}, f, indent=2)
+
+    def fit(self, samples: List[Tuple[List[float], float]]):
+        """Least-squares fit on (features, observed delay) samples from the event log or simulation runs"""
+        X = np.array([features for features, _ in samples], dtype=float)
+        y = np.array([delay for _, delay in samples], dtype=float)
+        self.weights, *_ = np.linalg.lstsq(X, y, rcond=None)
+        self.cache = {}
+        logger.info(f"Fitted delay model on {len(samples)} samples: {self.weights.round(3).tolist()}")
+
+    def state_key(self, train, current_time: datetime) -> Tuple:
+        return (train.delay, train.current_position, train.status, tuple(train.route), current_time.date())
+
+    def update_congestion(self, trains: Dict, current_time: datetime):
+        """Count trains timetabled through each section within the congestion window"""
+        fleet_key = frozenset(trains.keys())
+        if fleet_key == self.fleet_key:
+            return
+        arrivals: Dict[str, List[Tuple[str, datetime]]] = {}
+        for train_id, train in trains.items():
+            for section, times in train.schedule.items():
+                arrivals.setdefault(section, []).append((train_id, scheduled_time(times["arrival"], current_time)))
+
+        window = timedelta(minutes=self.congestion_window)
+        self.congestion = {}
+        for section, entries in arrivals.items():
+            for train_id, arrival in entries:
+                self.congestion[(train_id, section)] = sum(
+                    1 for other_id, other in entries if other_id != train_id and abs(other - arrival) <= window
+                )
+        self.fleet_key = fleet_key
+        self.cache = {}
+
+    def stop_features(self, train, current_time: datetime) -> List[Tuple[str, datetime, List[float]]]:
+        """Scheduled arrival and feature vector for every remaining stop of a train"""
+        rows = []
+        recovery = 0.0
+        previous_section = None
+        previous_departure = None
+        for stops_ahead, section in enumerate(train.route[train.current_position:]):
+            if section not in train.schedule:
+                continue
+            arrival = scheduled_time(train.schedule[section]["arrival"], current_time)
+            departure = scheduled_time(train.schedule[section]["departure"], current_time)
+            if previous_departure is not None:
+                minimum = 0.0
+                if self.occupancy_service:
+                    minimum = self.occupancy_service.running_time(previous_section, section).total_seconds() / 60
+                recovery += max(0.0, (arrival - previous_departure).total_seconds() / 60 - minimum)
+            rows.append((section, arrival, [
+                1.0,
+                float(train.delay),
+                recovery,
+                float(self.congestion.get((train.id, section), 0)),
+                float(stops_ahead)
+            ]))
+            # Dwell slack at this stop can absorb delay for the stops after it
+            dwell = (departure - arrival).total_seconds() / 60
+            if dwell > 0:
+                recovery += max(0.0, dwell - self.min_dwell)
+            previous_section = section
+            previous_departure = departure
+        return rows
+
+    def predict_batch(self, trains: Dict, current_time: datetime) -> Dict[str, List[Tuple[str, datetime]]]:
+        if self.weights is None:
+            return self.fallback.predict_batch(trains, current_time)
+
+        self.update_congestion(trains, current_time)
+
+        # Collect the stops of every train whose state changed into one feature matrix
+        stale = []
+        for train_id, train in trains.items():
+            key = self.state_key(train, current_time)
+            cached = self.cache.get(train_id)
+            if cached is None or cached[0] != key:
+                stale.append((train_id, key, self.stop_features(train, current_time)))
+
+        rows = [features for _, _, stops in stale for _, _, features in stops]
+        delays = np.clip(np.array(rows) @ self.weights, 0, None) if rows else []
+        offset = 0
+        for train_id, key, stops in stale:
+            predicted = [
+                (section, arrival + timedelta(minutes=float(delay)))
+                for (section, arrival, _), delay in zip(stops, delays[offset:offset + len(stops)])
+            ]
+            offset += len(stops)
+            self.cache[train_id] = (key, predicted)
+
+        return {
+            train_id: [(section, arrival) for section, arrival in self.cache[train_id][1] if arrival > current_time]
+            for train_id in trains
+        }
+
+    def invalidate(self, train_id: Optional[str] = None):
+        """Drop cached predictions for one train, or for the whole fleet"""
+        if train_id is None:
+            self.cache = {}
+        else:
+            self.cache.pop(train_id, None)
+
+def generate_simulated_samples(network_data: Dict, timetable_data: Dict, predictor: LinearDelayPredictor,
+                               runs: int = 200, max_initial_delay: int = 30,
+                               seed: int = 0) -> List[Tuple[List[float], float]]:
+    """Build training samples from simulation runs with randomly injected delays.
+
+    Each run replays the timetable through the block occupancy engine and
+    delays a random train at a random minute. At that minute the features of
+    every remaining stop of every active train are recorded, and each is
+    labelled with the arrival delay the run actually produces at that stop.
+    """
+    from services.simulation_service import SimulationService
+    from services.occupancy_service import OccupancyService
+    from services.network_topology import NetworkTopology
+
+    rng = np.random.default_rng(seed)
+    scenario_data = {
+        "network": network_data,
+        "timetable": timetable_data,
+        "disruption": {"disruptions": []},
+        "topology": NetworkTopology(network_data)
+    }
+    predictor.occupancy_service = OccupancyService()
+    predictor.occupancy_service.load_topology(scenario_data["topology"])
+
+    async def run_once(inject_minute: int, train_index: int, delay: int) -> List[Tuple[List[float], float]]:
+        simulation = SimulationService()
+        simulation.set_occupancy_service(OccupancyService())
+        await simulation.initialize(scenario_data)
+        simulation.current_time = simulation.scenario_start_time()
+        trains = simulation.trains
+        predictor.update_congestion(trains, simulation.current_time)
+
+        snapshot = []  # (train_id, route position, scheduled arrival, features)
+        arrivals: Dict[Tuple[str, int], datetime] = {}
+        for minute in range(1, 24 * 60):
+            simulation.current_time += timedelta(minutes=1)
+            if minute == inject_minute:
+                train = list(trains.values())[train_index]
+                await simulation.apply_disruption({
+                    "id": "TRAINING", "type": "delay", "train_id": train.id, "delay_minutes": delay
+                })
+                for active in trains.values():
+                    if active.status == "completed":
+                        continue
+                    for section, arrival, features in predictor.stop_features(active, simulation.current_time):
+                        position = active.current_position + int(features[-1])
+                        if position > active.current_position:
+                            snapshot.append((active.id, position, arrival, features))
+            await simulation.update_train_positions()
+            for train in trains.values():
+                if train.status != "completed":
+                    arrivals.setdefault((train.id, train.current_position), simulation.current_time)
+            if all(train.status == "completed" for train in trains.values()):
+                break
+
+        return [
+            (features, max(0.0, (arrivals[(train_id, position)] - scheduled).total_seconds() / 60))
+            for train_id, position, scheduled, features in snapshot
+            if (train_id, position) in arrivals
+        ]
+
+    # Inject before the last scheduled arrival so the delay still has stops to propagate to
+    last_arrival = max(
+        datetime.strptime(times["arrival"], "%H:%M")
+        for train_data in timetable_data.get("trains", [])
+        for times in train_data["schedule"].values()
+    )
+    horizon = max(1, (last_arrival.hour - 9) * 60 + last_arrival.minute)
+    train_count = len(timetable_data.get("trains", []))
+
+    async def run_all() -> List[Tuple[List[float], float]]:
+        samples = []
+        for _ in range(runs):
+            samples += await run_once(
+                int(rng.integers(1, horizon)),
+                int(rng.integers(0, train_count)),
+                int(rng.integers(0, max_initial_delay + 1))
+            )
+        return samples
+
+    return asyncio.run(run_all())
+
+def train_model(network_path: str, timetable_path: str, output_path: str, runs: int, seed: int):
+    """Fit the linear model on simulation runs over the scenario timetable and save it"""
+    with open(network_path, "r") as f:
+        network_data = json.load(f)
+    with open(timetable_path, "r") as f:
+        timetable_data = json.load(f)
+
+    predictor = LinearDelayPredictor()
+    predictor.fit(generate_simulated_samples(network_data, timetable_data, predictor, runs=runs, seed=seed))
+    predictor.save(output_path)
+    logger.info(f"Saved delay model to {output_path}")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Offline tools for the delay prediction model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train", help="Fit the model on simulation runs with random injected delays")
+    train_parser.add_argument("--network", default="data/network.json")
+    train_parser.add_argument("--timetable", default="data/timetable.json")
+    train_parser.add_argument("--output", default="data/delay_model.json")
+    train_parser.add_argument("--runs", type=int, default=500)
+    train_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "train":
+        train_model(args.network, args.timetable, args.output, args.runs, args.seed)
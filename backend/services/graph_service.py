@@ -0,0 +1,214 @@
+import bisect
+import logging
+from typing import Dict, List, Set, Tuple, Optional
+from datetime import datetime
+from services.network_topology import NetworkTopology
+
+logger = logging.getLogger(__name__)
+
+# Bounds on the size of a single graph response
+MIN_POINTS = 3  # LTTB always keeps the first and last point
+MAX_POINTS = 5000
+MIN_COLUMNS = 1
+MAX_COLUMNS = 1000
+
+def lttb(points: List[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """Largest-Triangle-Three-Buckets downsampling of an (x, y) series"""
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    sampled = [points[0]]
+    bucket_size = (len(points) - 2) / (threshold - 2)
+    selected = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third corner of the triangle
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, len(points))
+        next_bucket = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = points[selected]
+        best_area = -1.0
+        best = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (points[j][1] - ay) - (ax - points[j][0]) * (avg_y - ay))
+            if area > best_area:
+                best_area = area
+                best = j
+        sampled.append(points[best])
+        selected = best
+
+    sampled.append(points[-1])
+    return sampled
+
+class GraphService:
+    """Incremental per-tick history behind the time-distance and occupancy graphs.
+
+    Every simulation tick appends one sample at the finest level and, every
+    2^l ticks, one sample at level l. A request reads the coarsest level that
+    still has enough samples in its window, so the work per request depends on
+    the requested size rather than on the length of the window.
+    """
+
+    def __init__(self):
+        self.section_ids: List[str] = []
+        self.section_index: Dict[str, int] = {}
+        self.section_distances: Dict[str, float] = {}
+        self.times: List[datetime] = []
+        self.timestamps: List[float] = []
+        # train_id -> levels of parallel (tick timestamps, distances along the line) lists.
+        # Level l keeps the raw samples whose index + 1 is a multiple of 2^l.
+        self.series: Dict[str, List[Tuple[List[float], List[float]]]] = {}
+        # Level l row j holds the section occupants over raw ticks [j * 2^l, (j + 1) * 2^l)
+        self.occupancy: List[List[List[Set[str]]]] = []
+        self.oversampling = 4  # level samples per requested point fed to LTTB
+        self.default_max_points = 500
+        self.default_max_columns = 200
+
+    def build_from_network(self, network_data: Dict):
+        """Compute each section's distance along the line from the network distances"""
+        self.load_topology(NetworkTopology(network_data))
+
+    def load_topology(self, topology: NetworkTopology):
+        """Take section order and distances from a compiled, possibly shared, topology"""
+        self.section_ids = topology.section_ids
+        self.section_index = topology.section_order
+        self.section_distances = topology.section_distances
+        self.reset()
+
+    def reset(self):
+        """Clear the recorded history"""
+        self.times = []
+        self.timestamps = []
+        self.series = {}
+        self.occupancy = []
+
+    def record_tick(self, current_time: datetime, trains: Dict):
+        """Append the state of one simulation tick to the history"""
+        if self.times and current_time <= self.times[-1]:
+            # Simulation clock restarted, history no longer applies
+            self.reset()
+        timestamp = current_time.timestamp()
+        self.times.append(current_time)
+        self.timestamps.append(timestamp)
+
+        row: List[Set[str]] = [set() for _ in self.section_ids]
+        for train in trains.values():
+            if train.status == "completed" or train.current_section not in self.section_index:
+                continue
+            row[self.section_index[train.current_section]].add(train.id)
+            levels = self.series.setdefault(train.id, [([], [])])
+            self.append_point(levels, timestamp, self.section_distances[train.current_section])
+        self.append_row(row)
+
+    def append_point(self, levels: List[Tuple[List[float], List[float]]], timestamp: float, distance: float):
+        """Append a sample to the finest level and to every coarser level whose stride it completes"""
+        count = len(levels[0][0]) + 1
+        level = 0
+        while True:
+            times, distances = levels[level]
+            times.append(timestamp)
+            distances.append(distance)
+            level += 1
+            if count % (1 << level):
+                break
+            if level == len(levels):
+                levels.append(([], []))
+
+    def append_row(self, row: List[Set[str]]):
+        """Append an occupancy row and merge completed pairs of rows into the coarser levels"""
+        if not self.occupancy:
+            self.occupancy.append([])
+        self.occupancy[0].append(row)
+        level = 0
+        while len(self.occupancy[level]) % 2 == 0:
+            first, second = self.occupancy[level][-2:]
+            if level + 1 == len(self.occupancy):
+                self.occupancy.append([])
+            self.occupancy[level + 1].append([a | b for a, b in zip(first, second)])
+            level += 1
+
+    def occupants_between(self, lo: int, hi: int) -> List[Set[str]]:
+        """Occupants of every section over raw ticks [lo, hi), from the fewest aligned level rows"""
+        occupants: List[Set[str]] = [set() for _ in self.section_ids]
+        i = lo
+        while i < hi:
+            level = 0
+            while (level + 1 < len(self.occupancy) and i % (1 << (level + 1)) == 0
+                   and i + (1 << (level + 1)) <= hi):
+                level += 1
+            for section_occupants, row_occupants in zip(occupants, self.occupancy[level][i >> level]):
+                section_occupants |= row_occupants
+            i += 1 << level
+        return occupants
+
+    def sample_count(self) -> int:
+        """Number of stored samples across all levels, a proxy for the memory held by the history"""
+        return (sum(len(rows) for rows in self.occupancy)
+                + sum(len(times) for levels in self.series.values() for times, _ in levels))
+
+    def window(self, timestamps: List[float], start: Optional[datetime], end: Optional[datetime]) -> Tuple[int, int]:
+        """Index range of the samples inside [start, end]"""
+        lo = bisect.bisect_left(timestamps, start.timestamp()) if start else 0
+        hi = bisect.bisect_right(timestamps, end.timestamp()) if end else len(timestamps)
+        return lo, hi
+
+    def window_points(self, levels: List[Tuple[List[float], List[float]]], start: Optional[datetime],
+                      end: Optional[datetime], max_points: int) -> List[Tuple[float, float]]:
+        """Samples of one train in the window, read from the coarsest level that is dense enough for LTTB"""
+        times, distances = levels[0]
+        lo, hi = self.window(times, start, end)
+        count = hi - lo
+        level = min(len(levels) - 1, max(0, (count // (self.oversampling * max_points)).bit_length() - 1))
+        if level == 0:
+            return list(zip(times[lo:hi], distances[lo:hi]))
+
+        level_times, level_distances = levels[level]
+        level_lo, level_hi = self.window(level_times, start, end)
+        points = list(zip(level_times[level_lo:level_hi], level_distances[level_lo:level_hi]))
+        # Keep the exact ends of the window, which the coarse level may have skipped
+        if not points or points[0][0] != times[lo]:
+            points.insert(0, (times[lo], distances[lo]))
+        if points[-1][0] != times[hi - 1]:
+            points.append((times[hi - 1], distances[hi - 1]))
+        return points
+
+    def get_time_distance(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                          max_points: Optional[int] = None, train_id: Optional[str] = None) -> Dict:
+        """Downsampled time-distance series of every train over a time window"""
+        max_points = min(max(max_points or self.default_max_points, MIN_POINTS), MAX_POINTS)
+        trains = {}
+        for series_id, levels in self.series.items():
+            if train_id and series_id != train_id:
+                continue
+            points = lttb(self.window_points(levels, start, end, max_points), max_points)
+            trains[series_id] = [
+                {"time": datetime.fromtimestamp(t).isoformat(), "distance": d} for t, d in points
+            ]
+        return {
+            "sections": [{"id": s, "distance": self.section_distances[s]} for s in self.section_ids],
+            "trains": trains
+        }
+
+    def get_occupancy(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                      max_columns: Optional[int] = None) -> Dict:
+        """Section occupancy matrix over a time window, merged into at most max_columns buckets"""
+        max_columns = min(max(max_columns or self.default_max_columns, MIN_COLUMNS), MAX_COLUMNS)
+        lo, hi = self.window(self.timestamps, start, end)
+        count = hi - lo
+        buckets = min(count, max_columns)
+
+        times = []
+        matrix: List[List[List[str]]] = [[] for _ in self.section_ids]
+        for b in range(buckets):
+            bucket_lo = lo + b * count // buckets
+            bucket_hi = lo + (b + 1) * count // buckets
+            times.append(self.times[bucket_lo].isoformat())
+            # Keep every train seen in the bucket so short occupations are not lost
+            for i, occupants in enumerate(self.occupants_between(bucket_lo, bucket_hi)):
+                matrix[i].append(sorted(occupants))
+
+        return {"sections": self.section_ids, "times": times, "matrix": matrix}
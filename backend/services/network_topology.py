@@ -0,0 +1,93 @@
+import logging
+from typing import Dict, List, Tuple
+from datetime import timedelta
+
+logger = logging.getLogger(__name__)
+
+class BlockSection:
+    """Static description of a signal-protected block section"""
+
+    def __init__(self, section_id: str, tracks: List[str], signals: List[str], headway: int):
+        self.id = section_id
+        self.tracks = tracks
+        self.signals = signals
+        self.headway = headway  # minutes
+
+class NetworkTopology:
+    """Immutable view of the network compiled once and shared by every session.
+
+    Holds the block sections, running-time inputs, routing adjacency and the
+    distance of each section along the line. Anything that changes while a
+    simulation runs (reservations, train positions, history) lives in the
+    per-session services instead.
+    """
+
+    default_headways = {"block": 3, "arrival": 2, "departure": 2}
+
+    def __init__(self, network_data: Dict):
+        self.line_speed = network_data.get("line_speed_kmh", 60)  # km/h
+        self.min_running_time = 1  # minutes
+        self.section_ids: List[str] = [section["id"] for section in network_data.get("sections", [])]
+        self.section_order: Dict[str, int] = {section_id: i for i, section_id in enumerate(self.section_ids)}
+
+        self.distances: Dict[Tuple[str, str], float] = {}
+        for key, distance in network_data.get("distances", {}).items():
+            origin, _, destination = key.partition("-")
+            self.distances[(origin, destination)] = distance
+            self.distances[(destination, origin)] = distance
+
+        self.block_sections = self.build_block_sections(network_data)
+        self.adjacency = self.build_adjacency(network_data)
+        self.section_distances = self.build_section_distances()
+        logger.info(f"Compiled network topology: {len(self.section_ids)} sections, "
+                    f"{len(self.block_sections)} block sections")
+
+    def build_block_sections(self, network_data: Dict) -> Dict[str, BlockSection]:
+        """Derive block sections and their headways from the signals"""
+        headways = {**self.default_headways, **network_data.get("headways", {})}
+        signals_by_section: Dict[str, List[Dict]] = {}
+        for signal in network_data.get("signals", []):
+            signals_by_section.setdefault(signal["location"], []).append(signal)
+
+        block_sections = {}
+        for section in network_data.get("sections", []):
+            section_signals = signals_by_section.get(section["id"], [])
+            # A section is only a block section if a signal protects it
+            if not section_signals:
+                continue
+            block_sections[section["id"]] = BlockSection(
+                section_id=section["id"],
+                tracks=section.get("tracks", ["main"]),
+                signals=[s["id"] for s in section_signals],
+                headway=max(headways.get(s.get("type"), headways["block"]) for s in section_signals)
+            )
+        return block_sections
+
+    def build_adjacency(self, network_data: Dict) -> Dict[str, List[str]]:
+        """Section adjacency graph from the network distances and connections"""
+        adjacency: Dict[str, List[str]] = {section_id: [] for section_id in self.section_ids}
+        links = [key.split("-", 1) for key in network_data.get("distances", {})]
+        links += [[c["from"], c["to"]] for c in network_data.get("connections", [])]
+        for origin, destination in links:
+            for a, b in ((origin, destination), (destination, origin)):
+                if b not in adjacency.setdefault(a, []):
+                    adjacency[a].append(b)
+        return adjacency
+
+    def build_section_distances(self) -> Dict[str, float]:
+        """Distance of each section along the line, in network order"""
+        section_distances = {}
+        total = 0.0
+        previous = None
+        for section_id in self.section_ids:
+            if previous is not None:
+                total += self.distances.get((previous, section_id), 0)
+            section_distances[section_id] = total
+            previous = section_id
+        return section_distances
+
+    def running_time(self, from_section: str, to_section: str) -> timedelta:
+        """Minimum running time between two adjacent sections"""
+        distance = self.distances.get((from_section, to_section), 0)
+        minutes = max(self.min_running_time, distance / self.line_speed * 60)
+        return timedelta(minutes=minutes)
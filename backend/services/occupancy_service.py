@@ -0,0 +1,293 @@
+import logging
+from typing import Dict, List, Tuple, Optional
+from datetime import datetime, timedelta
+from sortedcontainers import SortedKeyList
+from services.network_topology import NetworkTopology
+
+logger = logging.getLogger(__name__)
+
+# Occupation that has started but whose exit time is not yet known
+OPEN_END = datetime.max
+
+class Reservation:
+    def __init__(self, train_id: str, start: datetime, end: datetime, visit: int = 0):
+        self.train_id = train_id
+        self.visit = visit  # distinguishes repeated passes of one train through the same block
+        self.start = start
+        self.end = end  # exclusive, already includes the block headway
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return (self.train_id, self.visit)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        return self.start < end and start < self.end
+
+    def __str__(self):
+        return f"Reservation of {self.train_id} from {self.start} to {self.end}"
+
+class ReservationTable:
+    """Set of non-overlapping reservations on one track, kept sorted by start time.
+
+    Because reservations never overlap, ends are sorted as well, so every
+    lookup only needs a binary search and a look at the neighbouring entry.
+    Insertion and removal are logarithmic in the size of the table.
+    """
+
+    def __init__(self):
+        self.reservations = SortedKeyList(key=lambda r: r.start)
+        self.by_key: Dict[Tuple[str, int], Reservation] = {}
+
+    def find_conflict(self, start: datetime, end: datetime) -> Optional[Reservation]:
+        """Return the reservation overlapping [start, end), if any"""
+        idx = self.reservations.bisect_key_left(end)
+        if idx > 0:
+            previous = self.reservations[idx - 1]
+            if previous.overlaps(start, end):
+                return previous
+        return None
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        return self.find_conflict(start, end) is None
+
+    def occupant_at(self, time: datetime) -> Optional[Reservation]:
+        """Return the reservation covering the given instant"""
+        idx = self.reservations.bisect_key_right(time)
+        if idx > 0 and self.reservations[idx - 1].end > time:
+            return self.reservations[idx - 1]
+        return None
+
+    def reserve(self, train_id: str, start: datetime, end: datetime, visit: int = 0) -> Optional[Reservation]:
+        """Insert a reservation, returning the blocking one instead if the slot is taken"""
+        self.release(train_id, visit)
+        blocking = self.find_conflict(start, end)
+        if blocking:
+            return blocking
+        reservation = Reservation(train_id, start, end, visit)
+        self.reservations.add(reservation)
+        self.by_key[reservation.key] = reservation
+        return None
+
+    def release(self, train_id: str, visit: int = 0) -> Optional[Reservation]:
+        """Remove the reservation held by a train for one visit"""
+        reservation = self.by_key.pop((train_id, visit), None)
+        if reservation:
+            self.reservations.remove(reservation)
+        return reservation
+
+    def close(self, train_id: str, end: datetime, visit: int = 0) -> Optional[Reservation]:
+        """Set the end of an open occupation once the train has left the block"""
+        reservation = self.by_key.get((train_id, visit))
+        if reservation:
+            # Shrinking the end cannot create an overlap and the sort key is the start
+            reservation.end = max(reservation.start, end)
+        return reservation
+
+    def prune(self, before: datetime):
+        """Drop reservations that ended before the given time"""
+        # Ends are sorted like starts, so expired reservations form a prefix
+        while self.reservations and self.reservations[0].end <= before:
+            reservation = self.reservations.pop(0)
+            self.by_key.pop(reservation.key, None)
+
+class Block:
+    def __init__(self, section_id: str, tracks: List[str], signals: List[str], headway: int):
+        self.id = section_id
+        self.signals = signals
+        self.headway = timedelta(minutes=headway)
+        self.tables: Dict[str, ReservationTable] = {track: ReservationTable() for track in tracks}
+
+    def find_track(self, start: datetime, end: datetime) -> Tuple[Optional[str], List[Reservation]]:
+        """Find a free track for [start, end), returning the blockers when there is none"""
+        blockers = []
+        for track, table in self.tables.items():
+            blocking = table.find_conflict(start, end)
+            if blocking is None:
+                return track, []
+            blockers.append(blocking)
+        return None, blockers
+
+class OccupancyService:
+    def __init__(self):
+        self.topology: Optional[NetworkTopology] = None
+        self.blocks: Dict[str, Block] = {}
+        # train_id -> (block_id, track, entry_time, visit) of the block currently occupied
+        self.positions: Dict[str, Tuple[str, str, datetime, int]] = {}
+        # Bumped on every occupancy change so dependants can invalidate caches
+        self.version = 0
+
+    def build_from_network(self, network_data: Dict):
+        """Compile the network and set up empty block sections for it"""
+        self.load_topology(NetworkTopology(network_data))
+
+    def load_topology(self, topology: NetworkTopology):
+        """Use a compiled, possibly shared, topology and start from empty reservation tables"""
+        self.topology = topology
+        self.reset()
+        logger.info(f"Set up {len(self.blocks)} block sections")
+
+    def reset(self):
+        """Drop every reservation and train position, keeping the topology"""
+        self.blocks = {
+            section.id: Block(section.id, section.tracks, section.signals, section.headway)
+            for section in self.topology.block_sections.values()
+        } if self.topology else {}
+        self.positions = {}
+        self.version += 1
+
+    @property
+    def section_order(self) -> Dict[str, int]:
+        return self.topology.section_order if self.topology else {}
+
+    def running_time(self, from_section: str, to_section: str) -> timedelta:
+        """Minimum running time between two adjacent sections"""
+        if not self.topology:
+            return timedelta(minutes=1)
+        return self.topology.running_time(from_section, to_section)
+
+    def direction(self, route: List[str], section_id: str) -> int:
+        """Direction of travel through a section: 1 along the network order, -1 against it"""
+        if section_id not in route:
+            return 0
+        idx = route.index(section_id)
+        neighbours = route[max(0, idx - 1):idx + 2]
+        orders = [self.section_order.get(s, 0) for s in neighbours]
+        return 1 if orders[-1] >= orders[0] else -1
+
+    def enter_block(self, train_id: str, section_id: str, time: datetime, visit: int = 0) -> bool:
+        """Move a train into a block, releasing the one behind it. Returns False on a red signal"""
+        current = self.positions.get(train_id)
+        if current and current[0] == section_id and current[3] == visit:
+            return True
+
+        block = self.blocks.get(section_id)
+        if block is not None:
+            track, blockers = block.find_track(time, OPEN_END)
+            if track is None:
+                logger.debug(f"Train {train_id} held at {section_id} by {', '.join(b.train_id for b in blockers)}")
+                return False
+            block.tables[track].reserve(train_id, time, OPEN_END, visit)
+
+        self.leave_block(train_id, time)
+        if block is not None:
+            self.positions[train_id] = (section_id, track, time, visit)
+            self.version += 1
+        return True
+
+    def leave_block(self, train_id: str, time: datetime):
+        """Close the train's current occupation, keeping the headway behind it"""
+        current = self.positions.pop(train_id, None)
+        if current:
+            block_id, track, _, visit = current
+            block = self.blocks[block_id]
+            block.tables[track].close(train_id, time + block.headway, visit)
+            self.version += 1
+
+    def block_wait(self, section_id: str, time: datetime) -> Optional[timedelta]:
+        """Wait before a block can be entered at the given time, None if it is held indefinitely"""
+        block = self.blocks.get(section_id)
+        if block is None:
+            return timedelta(0)
+        earliest = OPEN_END
+        for table in block.tables.values():
+            occupant = table.occupant_at(time)
+            if occupant is None:
+                return timedelta(0)
+            earliest = min(earliest, occupant.end)
+        return None if earliest == OPEN_END else earliest - time
+
+    def earliest_exit(self, train_id: str, next_section: str) -> Optional[datetime]:
+        """Earliest time a train may leave its current block for the next section"""
+        current = self.positions.get(train_id)
+        if not current:
+            return None
+        block_id, _, entry_time, _ = current
+        return entry_time + self.running_time(block_id, next_section)
+
+    def predicted_intervals(self, route: List[str],
+                            predictions: List[Tuple[str, datetime]]) -> List[Tuple[str, int, datetime, datetime]]:
+        """Turn predicted section arrivals into (block, visit, start, end) intervals including headway"""
+        intervals = []
+        for i, (section, arrival) in enumerate(predictions):
+            block = self.blocks.get(section)
+            if block is None:
+                continue
+            if i + 1 < len(predictions):
+                exit_time = max(predictions[i + 1][1], arrival + self.running_time(section, predictions[i + 1][0]))
+            else:
+                idx = route.index(section) if section in route else -1
+                next_section = route[idx + 1] if 0 <= idx < len(route) - 1 else section
+                exit_time = arrival + self.running_time(section, next_section)
+            intervals.append((section, i, arrival, exit_time + block.headway))
+        return intervals
+
+    def current_exit(self, train, block_id: str, predictions: List[Tuple[str, datetime]],
+                     current_time: datetime) -> datetime:
+        """Expected time a train leaves the block it occupies now"""
+        next_index = train.current_position + 1
+        next_section = train.route[next_index] if next_index < len(train.route) else block_id
+        exit_time = max(current_time, self.earliest_exit(train.id, next_section))
+        for section, arrival in predictions:
+            if section != block_id:
+                # Held in the block until the predicted arrival at the next stop
+                return max(exit_time, arrival)
+        return exit_time
+
+    def find_predicted_conflicts(self, trains: Dict, predictions: Dict[str, List[Tuple[str, datetime]]],
+                                 current_time: datetime) -> List[Tuple[str, str, str, datetime]]:
+        """Book live and predicted occupations into scratch tables and report the clashes.
+
+        Each scratch table starts with the trains already inside the block, held
+        until their expected exit plus headway, so predictions are checked
+        against the engine's actual state. Returns (blocking_train, train, block,
+        time) tuples, at most one per train pair.
+        """
+        scratch = {block_id: Block(block_id, list(block.tables.keys()), block.signals, 0)
+                   for block_id, block in self.blocks.items()}
+        for train_id, (block_id, track, entry_time, visit) in self.positions.items():
+            train = trains.get(train_id)
+            if train is None:
+                continue
+            exit_time = self.current_exit(train, block_id, predictions.get(train_id, []), current_time)
+            scratch[block_id].tables[track].reserve(
+                train_id, entry_time, exit_time + self.blocks[block_id].headway, visit
+            )
+
+        clashes = []
+        seen = set()
+        for train_id, train_predictions in predictions.items():
+            route = trains[train_id].route
+            current_block = self.positions.get(train_id, (None,))[0]
+            for section, index, start, end in self.predicted_intervals(route, train_predictions):
+                if index == 0 and section == current_block:
+                    # Already booked from the live position
+                    continue
+                block = scratch[section]
+                track, blockers = block.find_track(start, end)
+                if track is not None:
+                    # Negative visits keep predictions apart from the live bookings
+                    block.tables[track].reserve(train_id, start, end, -1 - index)
+                    continue
+                for blocking in blockers:
+                    pair = frozenset((blocking.train_id, train_id))
+                    if pair in seen:
+                        continue
+                    seen.add(pair)
+                    clashes.append((blocking.train_id, train_id, section, max(start, blocking.start)))
+        return clashes
+
+    def prune(self, before: datetime):
+        """Forget reservations that have fully expired"""
+        for block in self.blocks.values():
+            for table in block.tables.values():
+                table.prune(before)
+
+    def get_occupancy_snapshot(self, time: datetime) -> Dict:
+        """Current occupant of every block track"""
+        snapshot = {}
+        for block_id, block in self.blocks.items():
+            snapshot[block_id] = {}
+            for track, table in block.tables.items():
+                occupant = table.occupant_at(time)
+                snapshot[block_id][track] = occupant.train_id if occupant else None
+        return snapshot
@@ -0,0 +1,179 @@
+import heapq
+import logging
+from typing import Dict, List, Tuple, Optional
+from datetime import datetime, timedelta
+from services.network_topology import NetworkTopology
+
+logger = logging.getLogger(__name__)
+
+class Route:
+    def __init__(self, sections: List[str], departure: datetime, arrival: datetime):
+        self.sections = sections
+        self.departure = departure
+        self.arrival = arrival
+
+    @property
+    def travel_minutes(self) -> float:
+        return (self.arrival - self.departure).total_seconds() / 60
+
+    def to_dict(self) -> Dict:
+        return {
+            "sections": self.sections,
+            "departure": self.departure.isoformat(),
+            "arrival": self.arrival.isoformat(),
+            "travel_minutes": round(self.travel_minutes, 1)
+        }
+
+    def __str__(self):
+        return f"Route {'-'.join(self.sections)} ({self.travel_minutes:.1f} min)"
+
+class RoutingService:
+    def __init__(self):
+        self.graph: Dict[str, List[str]] = {}
+        self.occupancy_service = None
+        self.time_bucket = 5  # minutes
+        self.max_alternatives = 3
+        self.open_occupation_penalty = 10  # minutes assumed for a block with no known exit time
+        # (origin, destination, time bucket) -> (k requested, routes found)
+        self.route_cache: Dict[Tuple[str, str, int], Tuple[int, List[Route]]] = {}
+        # Occupancy version the cached routes were computed against
+        self.cache_version = 0
+
+    def build_from_network(self, network_data: Dict):
+        """Build the section adjacency graph from the network distances and connections"""
+        self.load_topology(NetworkTopology(network_data))
+
+    def load_topology(self, topology: NetworkTopology):
+        """Route over the adjacency of a compiled, possibly shared, topology"""
+        # Shared between sessions: read only
+        self.graph = topology.adjacency
+        self.invalidate()
+        logger.info(f"Routing graph has {len(self.graph)} nodes")
+
+    def occupancy_version(self) -> int:
+        return self.occupancy_service.version if self.occupancy_service else 0
+
+    def edge_cost(self, origin: str, destination: str, time: datetime) -> timedelta:
+        """Time-dependent cost: running time plus the wait for the next block to clear"""
+        if not self.occupancy_service:
+            return timedelta(minutes=1)
+        cost = self.occupancy_service.running_time(origin, destination)
+        wait = self.occupancy_service.block_wait(destination, time + cost)
+        if wait is None:
+            wait = timedelta(minutes=self.open_occupation_penalty)
+        return cost + wait
+
+    def shortest_path(self, origin: str, destination: str, departure: datetime,
+                      banned_nodes: Optional[set] = None,
+                      banned_edges: Optional[set] = None) -> Optional[Route]:
+        """Time-dependent Dijkstra from origin to destination"""
+        if origin not in self.graph or destination not in self.graph:
+            return None
+        banned_nodes = banned_nodes or set()
+        banned_edges = banned_edges or set()
+
+        best = {origin: departure}
+        previous: Dict[str, str] = {}
+        queue = [(departure, origin)]
+        while queue:
+            time, node = heapq.heappop(queue)
+            if node == destination:
+                break
+            if time > best.get(node, datetime.max):
+                continue
+            for neighbour in self.graph[node]:
+                if neighbour in banned_nodes or (node, neighbour) in banned_edges:
+                    continue
+                arrival = time + self.edge_cost(node, neighbour, time)
+                if arrival < best.get(neighbour, datetime.max):
+                    best[neighbour] = arrival
+                    previous[neighbour] = node
+                    heapq.heappush(queue, (arrival, neighbour))
+
+        if destination not in best:
+            return None
+        sections = [destination]
+        while sections[-1] != origin:
+            sections.append(previous[sections[-1]])
+        sections.reverse()
+        return Route(sections, departure, best[destination])
+
+    def evaluate_route(self, sections: List[str], departure: datetime) -> Route:
+        """Arrival time of a fixed section sequence under current occupancy"""
+        time = departure
+        for origin, destination in zip(sections, sections[1:]):
+            time += self.edge_cost(origin, destination, time)
+        return Route(sections, departure, time)
+
+    def k_shortest_paths(self, origin: str, destination: str, departure: datetime, k: int) -> List[Route]:
+        """Yen's algorithm for the k fastest loopless routes"""
+        first = self.shortest_path(origin, destination, departure)
+        if not first:
+            return []
+        routes = [first]
+        candidates: List[Tuple[datetime, List[str]]] = []
+        seen = {tuple(first.sections)}
+
+        while len(routes) < k:
+            last = routes[-1].sections
+            for i in range(len(last) - 1):
+                spur_node = last[i]
+                root = last[:i + 1]
+                banned_edges = {(r.sections[i], r.sections[i + 1]) for r in routes
+                                if r.sections[:i + 1] == root and len(r.sections) > i + 1}
+                banned_nodes = set(root[:-1])
+                spur_departure = self.evaluate_route(root, departure).arrival
+                spur = self.shortest_path(spur_node, destination, spur_departure, banned_nodes, banned_edges)
+                if not spur:
+                    continue
+                sections = root[:-1] + spur.sections
+                if tuple(sections) in seen:
+                    continue
+                seen.add(tuple(sections))
+                heapq.heappush(candidates, (spur.arrival, sections))
+            if not candidates:
+                break
+            arrival, sections = heapq.heappop(candidates)
+            routes.append(Route(sections, departure, arrival))
+
+        return routes
+
+    def get_routes(self, origin: str, destination: str, departure: datetime,
+                   k: Optional[int] = None) -> List[Route]:
+        """Return up to k alternative routes, cached per origin, destination and time bucket"""
+        if k is None:
+            k = self.max_alternatives
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}")
+        if self.cache_version != self.occupancy_version():
+            self.invalidate()
+
+        bucket = int(departure.timestamp() // (self.time_bucket * 60))
+        key = (origin, destination, bucket)
+        cached = self.route_cache.get(key)
+        if cached is not None and cached[0] >= k:
+            return cached[1][:k]
+
+        routes = self.k_shortest_paths(origin, destination, departure, k)
+        self.route_cache[key] = (k, routes)
+        return routes
+
+    def find_alternative_route(self, route: List[str], current_section: str, avoid: str,
+                               departure: datetime) -> Optional[Route]:
+        """Fastest route from the current section to the end of the route that avoids a section"""
+        destination = route[-1]
+        if current_section == avoid or destination == avoid:
+            return None
+        for candidate in self.get_routes(current_section, destination, departure):
+            if avoid not in candidate.sections:
+                return candidate
+        return None
+
+    def invalidate(self):
+        """Drop all cached routes"""
+        self.route_cache = {}
+        self.cache_version = self.occupancy_version()
+
+    def set_occupancy_service(self, occupancy_service):
+        """Set the block occupancy engine that supplies time-dependent edge costs"""
+        self.occupancy_service = occupancy_service
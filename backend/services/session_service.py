@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+from services.simulation_service import SimulationService
+from services.conflict_detection_service import ConflictDetectionService
+from services.websocket_manager import WebSocketManager
+from services.occupancy_service import OccupancyService
+from services.routing_service import RoutingService
+from services.delay_prediction_service import LinearDelayPredictor
+from services.graph_service import GraphService
+from services.network_topology import NetworkTopology
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+
+class SimulationSession:
+    """One isolated simulation: its own fleet state, engines and WebSocket channel"""
+
+    def __init__(self, session_id: str, delay_weights=None, pinned: bool = False):
+        self.id = session_id
+        self.pinned = pinned  # pinned sessions are never evicted
+        self.created_at = time.time()
+        self.last_activity = time.monotonic()
+
+        self.websocket_manager = WebSocketManager()
+        self.simulation_service = SimulationService()
+        self.conflict_service = ConflictDetectionService()
+        self.occupancy_service = OccupancyService()
+        self.routing_service = RoutingService()
+        self.graph_service = GraphService()
+        self.delay_predictor = LinearDelayPredictor(delay_weights, self.occupancy_service)
+
+        # Connect services
+        self.simulation_service.set_websocket_manager(self.websocket_manager)
+        self.simulation_service.set_occupancy_service(self.occupancy_service)
+        self.conflict_service.set_occupancy_service(self.occupancy_service)
+        self.routing_service.set_occupancy_service(self.occupancy_service)
+        self.simulation_service.set_routing_service(self.routing_service)
+        self.conflict_service.set_routing_service(self.routing_service)
+        self.conflict_service.set_delay_predictor(self.delay_predictor)
+        self.simulation_service.set_graph_service(self.graph_service)
+        self.simulation_service.set_conflict_service(self.conflict_service)
+
+    async def initialize(self, scenario_data: Dict):
+        await self.simulation_service.initialize(scenario_data)
+
+    def charge(self):
+        """Context manager charging the CPU time of request handling to this session"""
+        return self.simulation_service.charge_cpu()
+
+    def touch(self):
+        """Record client activity so the session is not evicted"""
+        self.last_activity = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_activity
+
+    async def close(self):
+        """Stop the simulation and disconnect the session's clients"""
+        await self.simulation_service.cleanup()
+        for connection in list(self.websocket_manager.active_connections):
+            try:
+                await connection.close()
+            except Exception as e:
+                logger.error(f"Error closing WebSocket for session {self.id}: {e}")
+            self.websocket_manager.disconnect(connection)
+
+    def to_dict(self) -> Dict:
+        return {
+            "session_id": self.id,
+            "simulation_running": self.simulation_service.is_running(),
+            "connected_clients": len(self.websocket_manager.active_connections),
+            "cpu_seconds_used": round(self.simulation_service.cpu_seconds_used, 3),
+            "history_samples": self.graph_service.sample_count(),
+            "stop_reason": self.simulation_service.stop_reason,
+            "idle_seconds": round(self.idle_seconds(), 1)
+        }
+
+class SessionManager:
+    """Hosts concurrent sessions on one event loop, sharing the read-only scenario data and topology"""
+
+    def __init__(self):
+        self.sessions: Dict[str, SimulationSession] = {}
+        self.scenario_data: Optional[Dict] = None
+        self.delay_weights = None
+        self.max_sessions = 50
+        self.max_cpu_seconds_per_session = 60.0
+        self.max_history_samples_per_session = 200000
+        self.idle_timeout = 30 * 60  # seconds without activity or clients
+        self.eviction_interval = 60  # seconds
+        self.eviction_task: Optional[asyncio.Task] = None
+
+    async def start(self, delay_model_path: str = "data/delay_model.json"):
+        """Load the scenario data and compile the topology once, then start idle eviction"""
+        loader = SimulationService()
+        await loader.load_scenario_data()
+        self.scenario_data = {
+            "network": loader.network_data,
+            "timetable": loader.timetable_data,
+            "disruption": loader.disruption_data,
+            "topology": NetworkTopology(loader.network_data)
+        }
+        self.delay_weights = LinearDelayPredictor.load(delay_model_path).weights
+
+        for session in self.sessions.values():
+            session.delay_predictor.weights = self.delay_weights
+            await session.initialize(self.scenario_data)
+        self.eviction_task = asyncio.create_task(self.eviction_loop())
+        logger.info("Session manager started")
+
+    def create_session(self, session_id: Optional[str] = None, pinned: bool = False) -> SimulationSession:
+        """Create a session; it must be initialized before use unless the manager is not started yet"""
+        if len(self.sessions) >= self.max_sessions:
+            raise ValueError(f"Session limit of {self.max_sessions} reached")
+        session_id = session_id or uuid.uuid4().hex[:12]
+        if session_id in self.sessions:
+            raise ValueError(f"Session {session_id} already exists")
+
+        session = SimulationSession(session_id, self.delay_weights, pinned)
+        if not pinned:
+            session.simulation_service.max_cpu_seconds = self.max_cpu_seconds_per_session
+            session.simulation_service.max_history_samples = self.max_history_samples_per_session
+        self.sessions[session_id] = session
+        logger.info(f"Created session {session_id}. Total sessions: {len(self.sessions)}")
+        return session
+
+    async def open_session(self, session_id: Optional[str] = None) -> SimulationSession:
+        """Create and initialize a session from the shared scenario data"""
+        session = self.create_session(session_id)
+        try:
+            await session.initialize(self.scenario_data)
+        except Exception:
+            del self.sessions[session.id]
+            raise
+        return session
+
+    def get_session(self, session_id: str) -> Optional[SimulationSession]:
+        session = self.sessions.get(session_id)
+        if session:
+            session.touch()
+        return session
+
+    def list_sessions(self) -> List[Dict]:
+        return [session.to_dict() for session in self.sessions.values()]
+
+    async def close_session(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if not session:
+            return False
+        await session.close()
+        logger.info(f"Closed session {session_id}. Total sessions: {len(self.sessions)}")
+        return True
+
+    async def evict_idle_sessions(self) -> List[str]:
+        """Close unpinned sessions with no clients and no activity within the idle timeout"""
+        evicted = [
+            session.id for session in self.sessions.values()
+            if not session.pinned
+            and not session.websocket_manager.active_connections
+            and session.idle_seconds() > self.idle_timeout
+        ]
+        for session_id in evicted:
+            await self.close_session(session_id)
+        if evicted:
+            logger.info(f"Evicted idle sessions: {', '.join(evicted)}")
+        return evicted
+
+    async def eviction_loop(self):
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            try:
+                await self.evict_idle_sessions()
+            except Exception as e:
+                logger.error(f"Error evicting idle sessions: {e}")
+
+    async def cleanup(self):
+        """Stop eviction and close every session"""
+        if self.eviction_task:
+            self.eviction_task.cancel()
+        for session_id in list(self.sessions.keys()):
+            await self.close_session(session_id)
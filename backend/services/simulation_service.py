@@ -1,9 +1,12 @@
 import json
 import asyncio
 import logging
+import time
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 import numpy as np
 from datetime import datetime, timedelta
+from services.network_topology import NetworkTopology
 
 logger = logging.getLogger(__name__)
 
@@ -24,22 +27,57 @@ class Train:
         else:
             self.status = "completed"
 
+    def reroute(self, new_route: List[str]):
+        """Replace the remaining route from the current section onwards"""
+        if self.current_section not in new_route:
+            raise ValueError(f"Route for {self.id} must include current section {self.current_section}")
+        self.route = self.route[:self.current_position] + new_route[new_route.index(self.current_section):]
+
 class SimulationService:
     def __init__(self):
         self.trains: Dict[str, Train] = {}
         self.network_data = {}
         self.timetable_data = {}
         self.disruption_data = {}
+        self.topology: Optional[NetworkTopology] = None
         self.current_time = datetime.now()
         self.simulation_running = False
         self.simulation_speed = 1  # 1x real time
         self.websocket_manager = None
+        self.occupancy_service = None
+        self.routing_service = None
+        self.graph_service = None
+        self.conflict_service = None
+        # train1/train2/location keys of the conflicts last broadcast
+        self.active_conflicts: List[str] = []
+        self.simulation_task: Optional[asyncio.Task] = None
+        # Resource caps, None means unlimited
+        self.max_cpu_seconds: Optional[float] = None
+        self.max_history_samples: Optional[int] = None
+        self.cpu_seconds_used = 0.0
+        self.stop_reason: Optional[str] = None
         
-    async def initialize(self):
-        """Initialize simulation with data files"""
+    async def initialize(self, scenario_data: Optional[Dict] = None):
+        """Initialize simulation with data files, or with already loaded scenario data"""
         try:
-            await self.load_scenario_data()
+            if scenario_data:
+                # Shared, read-only data: never mutate these dicts in place
+                self.network_data = scenario_data["network"]
+                self.timetable_data = scenario_data["timetable"]
+                self.disruption_data = scenario_data["disruption"]
+                self.topology = scenario_data.get("topology")
+            else:
+                await self.load_scenario_data()
+                self.topology = None
+            if self.topology is None:
+                self.topology = NetworkTopology(self.network_data)
+            if self.occupancy_service:
+                self.occupancy_service.load_topology(self.topology)
             await self.setup_trains()
+            if self.routing_service:
+                self.routing_service.load_topology(self.topology)
+            if self.graph_service:
+                self.graph_service.load_topology(self.topology)
             logger.info("Simulation service initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing simulation: {e}")
@@ -130,7 +168,9 @@ class SimulationService:
         logger.info("Created default scenario data")
 
     async def setup_trains(self):
-        """Initialize train objects from timetable"""
+        """Initialize train objects from timetable and book their starting blocks from their scheduled arrival"""
+        self.trains = {}
+        start_time = self.scenario_start_time()
         for train_data in self.timetable_data.get("trains", []):
             train = Train(
                 train_id=train_data["id"],
@@ -138,19 +178,45 @@ class SimulationService:
                 schedule=train_data["schedule"]
             )
             self.trains[train.id] = train
+            if self.occupancy_service and train.route:
+                origin = train.route[0]
+                arrival = start_time
+                if origin in train.schedule:
+                    scheduled = datetime.strptime(train.schedule[origin]["arrival"], "%H:%M")
+                    arrival = start_time.replace(hour=scheduled.hour, minute=scheduled.minute)
+                if not self.occupancy_service.enter_block(train.id, origin, arrival, 0):
+                    # Entered later in update_train_positions once a track frees up
+                    logger.info(f"No free track for train {train.id} at {origin} on arrival, it will wait")
         
         logger.info(f"Initialized {len(self.trains)} trains")
 
+    def scenario_start_time(self) -> datetime:
+        """Simulation clock value at the start of the scenario"""
+        return datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+
     async def start_simulation(self):
         """Start the simulation loop"""
         if self.simulation_running:
             return {"message": "Simulation already running"}
+        if self.cpu_budget_exhausted():
+            # The budget covers the whole session, restarting does not refill it
+            raise RuntimeError(
+                f"CPU budget of {self.max_cpu_seconds:g}s for this session is used up, open a new session"
+            )
         
         self.simulation_running = True
-        self.current_time = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.stop_reason = None
+        self.active_conflicts = []
+        self.current_time = self.scenario_start_time()
+        # Restart the scenario from a clean fleet and block state
+        if self.occupancy_service:
+            self.occupancy_service.reset()
+        await self.setup_trains()
+        if self.graph_service:
+            self.graph_service.reset()
         
         # Start the simulation loop
-        asyncio.create_task(self.simulation_loop())
+        self.simulation_task = asyncio.create_task(self.simulation_loop())
         
         return {
             "message": "Simulation started",
@@ -175,13 +241,27 @@ class SimulationService:
                 # Update train positions
                 await self.update_train_positions()
                 
+                # Append this tick to the graph history
+                if self.graph_service:
+                    with self.charge_cpu():
+                        self.graph_service.record_tick(self.current_time, self.trains)
+                
                 # Check for disruptions
                 await self.check_disruptions()
                 
+                # Score the fleet once and look for upcoming conflicts
+                if self.conflict_service:
+                    await self.check_conflicts()
+                
                 # Broadcast updates via WebSocket
                 if self.websocket_manager:
                     await self.broadcast_simulation_state()
                 
+                limit = self.exceeded_limit()
+                if limit:
+                    await self.stop_for_limit(limit)
+                    break
+                
                 # Sleep for simulation speed (1 second = 1 minute in simulation)
                 await asyncio.sleep(1.0 / self.simulation_speed)
                 
@@ -191,34 +271,136 @@ class SimulationService:
         
         logger.info("Simulation loop ended")
 
+    @contextmanager
+    def charge_cpu(self):
+        """Add the CPU time spent inside the block to this simulation's budget.
+
+        process_time is process-wide, so the block must not await: anything
+        other tasks ran while it was suspended would be charged here too.
+        """
+        start = time.process_time()
+        try:
+            yield
+        finally:
+            self.cpu_seconds_used += time.process_time() - start
+
+    def cpu_budget_exhausted(self) -> bool:
+        return self.max_cpu_seconds is not None and self.cpu_seconds_used >= self.max_cpu_seconds
+
+    def exceeded_limit(self) -> Optional[str]:
+        """Name of the resource cap this simulation has exceeded, if any"""
+        if self.max_cpu_seconds is not None and self.cpu_seconds_used > self.max_cpu_seconds:
+            return "cpu_time"
+        if (self.max_history_samples is not None and self.graph_service
+                and self.graph_service.sample_count() > self.max_history_samples):
+            return "memory"
+        return None
+
+    async def stop_for_limit(self, limit: str):
+        """Stop the simulation because a resource cap was hit"""
+        self.simulation_running = False
+        self.stop_reason = f"{limit}_limit_exceeded"
+        logger.warning(f"Simulation stopped: {self.stop_reason}")
+        if self.websocket_manager:
+            await self.websocket_manager.broadcast({
+                "type": "simulation_stopped",
+                "data": {"reason": self.stop_reason}
+            })
+
     async def update_train_positions(self):
-        """Update positions of all trains"""
+        """Move the fleet for this tick, charging the work to the CPU budget"""
+        with self.charge_cpu():
+            self.advance_trains()
+
+    def advance_trains(self):
+        """Advance each train to its next section once it is due and the block signal clears"""
         for train in self.trains.values():
-            if train.status == "running":
-                # Simple position update logic
-                # In a real implementation, this would use SUMO or another simulator
-                current_time_str = self.current_time.strftime("%H:%M")
-                
-                # Check if train should be at next station
-                for i, section in enumerate(train.route):
-                    if section in train.schedule:
-                        scheduled_time = train.schedule[section]["arrival"]
-                        if current_time_str >= scheduled_time and train.current_position <= i:
-                            train.update_position(i, self.current_time)
-                            break
+            if train.status == "completed" or train.current_position >= len(train.route):
+                continue
+            if train.status == "scheduled":
+                # Trains start running at their scheduled departure from the origin
+                if self.current_time < self.due_time(train, train.current_position, "departure"):
+                    continue
+                train.status = "running"
+            if (train.current_position == 0 and self.occupancy_service
+                    and train.id not in self.occupancy_service.positions
+                    and not self.occupancy_service.enter_block(train.id, train.route[0], self.current_time, 0)):
+                # Origin had no free track when the train was set up
+                train.delay += 1
+                continue
+            
+            next_position = train.current_position + 1
+            if next_position >= len(train.route):
+                # Final stop: release the block once the train's service ends
+                if self.current_time >= self.due_time(train, train.current_position, "departure"):
+                    if self.occupancy_service:
+                        self.occupancy_service.leave_block(train.id, self.current_time)
+                    train.update_position(next_position, self.current_time)
+                continue
+            
+            if self.current_time < self.due_time(train, next_position, "arrival"):
+                continue
+            if self.can_advance(train, next_position):
+                train.update_position(next_position, self.current_time)
+            else:
+                # Held at a red signal or still running through the current block
+                train.delay += 1
+
+        if self.occupancy_service:
+            self.occupancy_service.prune(self.current_time)
+
+    def due_time(self, train: Train, position: int, event: str) -> datetime:
+        """Scheduled arrival or departure at a route position, shifted by the train's delay"""
+        section = train.route[position]
+        if section not in train.schedule:
+            # Unscheduled sections (e.g. after a reroute) are due as soon as running time allows
+            return self.current_time
+        scheduled = datetime.strptime(train.schedule[section][event], "%H:%M")
+        return self.current_time.replace(
+            hour=scheduled.hour, minute=scheduled.minute, second=0, microsecond=0
+        ) + timedelta(minutes=train.delay)
+
+    def can_advance(self, train: Train, position: int) -> bool:
+        """Check running time and the block signal before a train enters the next section"""
+        if not self.occupancy_service:
+            return True
+        section = train.route[position]
+        earliest_exit = self.occupancy_service.earliest_exit(train.id, section)
+        if earliest_exit and self.current_time < earliest_exit:
+            return False
+        return self.occupancy_service.enter_block(train.id, section, self.current_time, position)
+
+    async def check_conflicts(self):
+        """Run conflict detection for this tick and broadcast when the conflict set changes"""
+        with self.charge_cpu():
+            conflicts = self.conflict_service.find_conflicts(self.trains, self.network_data, self.current_time)
+            conflict_keys = sorted(f"{c.train1_id}/{c.train2_id}/{c.location}" for c in conflicts)
+            if conflict_keys == self.active_conflicts:
+                return
+            self.active_conflicts = conflict_keys
+            message = json.dumps({
+                "type": "conflicts_detected",
+                "data": {
+                    "current_time": self.current_time.isoformat(),
+                    "conflicts": [conflict.to_dict() for conflict in conflicts]
+                }
+            })
+        if self.websocket_manager:
+            await self.websocket_manager.broadcast_text(message)
 
     async def check_disruptions(self):
         """Check and apply scheduled disruptions"""
-        current_time_str = self.current_time.strftime("%H:%M")
+        with self.charge_cpu():
+            current_time_str = self.current_time.strftime("%H:%M")
+            due = [d for d in self.disruption_data.get("disruptions", []) if d["inject_at"] == current_time_str]
         
-        for disruption in self.disruption_data.get("disruptions", []):
-            if disruption["inject_at"] == current_time_str:
-                await self.apply_disruption(disruption)
+        for disruption in due:
+            await self.apply_disruption(disruption)
 
     async def apply_disruption(self, disruption: Dict):
         """Apply a disruption to the simulation"""
         train_id = disruption["train_id"]
-        if train_id in self.trains:
+        if train_id in self.trains and self.trains[train_id].status != "completed":
             train = self.trains[train_id]
             train.delay += disruption["delay_minutes"]
             train.status = "delayed"
@@ -241,24 +423,26 @@ class SimulationService:
         if not self.websocket_manager:
             return
         
-        state = {
-            "type": "simulation_update",
-            "data": {
-                "current_time": self.current_time.isoformat(),
-                "trains": [
-                    {
-                        "id": train.id,
-                        "position": train.current_position,
-                        "section": train.current_section,
-                        "status": train.status,
-                        "delay": train.delay
-                    }
-                    for train in self.trains.values()
-                ]
+        with self.charge_cpu():
+            state = {
+                "type": "simulation_update",
+                "data": {
+                    "current_time": self.current_time.isoformat(),
+                    "trains": [
+                        {
+                            "id": train.id,
+                            "position": train.current_position,
+                            "section": train.current_section,
+                            "status": train.status,
+                            "delay": train.delay
+                        }
+                        for train in self.trains.values()
+                    ]
+                }
             }
-        }
+            message = json.dumps(state)
         
-        await self.websocket_manager.broadcast(state)
+        await self.websocket_manager.broadcast_text(message)
 
     def is_running(self):
         """Check if simulation is running"""
@@ -268,13 +452,37 @@ class SimulationService:
         """Apply the accepted resolution to the simulation"""
         # Implementation for applying AI-generated resolution
         logger.info(f"Applying resolution: {resolution_data}")
+        details = resolution_data.get("details", {})
+        train = self.trains.get(details.get("rerouted_train"))
+        if resolution_data.get("solution_type") == "reroute" and train and details.get("route"):
+            with self.charge_cpu():
+                train.reroute(details["route"])
+            return {"message": "Resolution applied successfully", "train_id": train.id, "route": train.route}
         return {"message": "Resolution applied successfully"}
 
     async def cleanup(self):
         """Cleanup simulation resources"""
         self.simulation_running = False
+        if self.simulation_task and not self.simulation_task.done():
+            self.simulation_task.cancel()
         logger.info("Simulation service cleaned up")
 
     def set_websocket_manager(self, manager):
         """Set the WebSocket manager for broadcasting updates"""
         self.websocket_manager = manager
+
+    def set_occupancy_service(self, occupancy_service):
+        """Set the block occupancy engine that enforces signals and headways"""
+        self.occupancy_service = occupancy_service
+
+    def set_routing_service(self, routing_service):
+        """Set the routing engine rebuilt whenever the network is loaded"""
+        self.routing_service = routing_service
+
+    def set_graph_service(self, graph_service):
+        """Set the history cache that serves the time-distance and occupancy graphs"""
+        self.graph_service = graph_service
+
+    def set_conflict_service(self, conflict_service):
+        """Set the conflict detector run on every tick"""
+        self.conflict_service = conflict_service
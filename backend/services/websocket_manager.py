@@ -24,7 +24,11 @@ class WebSocketManager:
 
     async def broadcast(self, data: dict):
         if self.active_connections:
-            message = json.dumps(data)
+            await self.broadcast_text(json.dumps(data))
+
+    async def broadcast_text(self, message: str):
+        """Send an already serialized message to every client"""
+        if self.active_connections:
             disconnected = []
             
             for connection in self.active_connections:
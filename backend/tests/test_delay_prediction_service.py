@@ -0,0 +1,69 @@
+import json
+from datetime import datetime, timedelta
+import numpy as np
+from services.delay_prediction_service import AdditiveDelayPredictor, LinearDelayPredictor
+from services.occupancy_service import OccupancyService
+from services.simulation_service import Train
+from tests.test_occupancy_service import SCENARIO
+
+WEIGHTS = [1.0, 0.9, -0.5, 1.5, 0.2]
+NOW = datetime(2025, 1, 1, 9, 0)
+
+def make_trains() -> dict:
+    trains = {
+        train_data["id"]: Train(train_data["id"], train_data["route"], train_data["schedule"])
+        for train_data in SCENARIO["timetable"]["trains"]
+    }
+    trains["T2"].delay = 7
+    trains["T2"].current_position = 1
+    return trains
+
+def make_predictor() -> LinearDelayPredictor:
+    occupancy_service = OccupancyService()
+    occupancy_service.build_from_network(SCENARIO["network"])
+    return LinearDelayPredictor(WEIGHTS, occupancy_service)
+
+def test_batch_matches_scoring_each_train_alone():
+    trains = make_trains()
+    predictor = make_predictor()
+
+    batch = predictor.predict_batch(trains, NOW)
+
+    for train_id, train in trains.items():
+        expected = [
+            (section, arrival + timedelta(minutes=float(max(0.0, np.dot(features, WEIGHTS)))))
+            for section, arrival, features in predictor.stop_features(train, NOW)
+        ]
+        assert batch[train_id] == [(section, arrival) for section, arrival in expected if arrival > NOW]
+
+def test_only_changed_train_is_rescored():
+    trains = make_trains()
+    predictor = make_predictor()
+    predictor.predict_batch(trains, NOW)
+
+    scored = []
+    stop_features = predictor.stop_features
+    predictor.stop_features = lambda train, current_time: scored.append(train.id) or stop_features(train, current_time)
+
+    predictor.predict_batch(trains, NOW)
+    assert scored == []
+
+    trains["T1"].delay += 3
+    predictor.predict_batch(trains, NOW)
+    assert scored == ["T1"]
+
+    trains["T2"].current_position += 1
+    predictor.predict_batch(trains, NOW)
+    assert scored == ["T1", "T2"]
+
+def test_missing_or_mismatched_model_falls_back_to_additive(tmp_path):
+    trains = make_trains()
+    expected = AdditiveDelayPredictor().predict_batch(trains, NOW)
+
+    mismatched = tmp_path / "delay_model.json"
+    mismatched.write_text(json.dumps({"features": ["bias", "current_delay"], "weights": [0.0, 1.0]}))
+
+    for path in (tmp_path / "missing.json", mismatched):
+        predictor = LinearDelayPredictor.load(str(path))
+        assert predictor.weights is None
+        assert predictor.predict_batch(trains, NOW) == expected
@@ -0,0 +1,81 @@
+import math
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from services.graph_service import GraphService, lttb
+
+NETWORK = {
+    "sections": [{"id": "A"}, {"id": "AB"}, {"id": "B"}],
+    "distances": {"A-AB": 0, "AB-B": 10}
+}
+
+START = datetime(2025, 1, 1, 9, 0)
+
+def make_graph(sections_by_tick: list) -> GraphService:
+    """Record one tick per entry, each a mapping of train id to its current section"""
+    graph = GraphService()
+    graph.build_from_network(NETWORK)
+    for minute, sections in enumerate(sections_by_tick):
+        trains = {
+            train_id: SimpleNamespace(id=train_id, status="running", current_section=section)
+            for train_id, section in sections.items()
+        }
+        graph.record_tick(START + timedelta(minutes=minute), trains)
+    return graph
+
+def test_lttb_bounds_length_and_keeps_ends():
+    points = [(float(x), math.sin(x / 7.0)) for x in range(1000)]
+
+    for threshold in (3, 10, 250):
+        sampled = lttb(points, threshold)
+        assert len(sampled) == threshold
+        assert sampled[0] == points[0] and sampled[-1] == points[-1]
+        assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+
+def test_time_distance_is_bounded_on_long_windows():
+    rng = random.Random(0)
+    graph = make_graph([{"T1": rng.choice(["A", "AB", "B"])} for _ in range(20000)])
+
+    for max_points in (2, 50, 500):
+        series = graph.get_time_distance(max_points=max_points)["trains"]["T1"]
+        assert len(series) <= max(max_points, 3)
+        assert series[0]["time"] == START.isoformat()
+        assert series[-1]["time"] == (START + timedelta(minutes=19999)).isoformat()
+
+def test_window_bounds_are_inclusive():
+    graph = make_graph([{"T1": "A"}] * 10)
+    start, end = START + timedelta(minutes=3), START + timedelta(minutes=6)
+
+    occupancy = graph.get_occupancy(start, end)
+    series = graph.get_time_distance(start, end)["trains"]["T1"]
+
+    expected = [(START + timedelta(minutes=m)).isoformat() for m in range(3, 7)]
+    assert occupancy["times"] == expected
+    assert [point["time"] for point in series] == expected
+
+def test_short_occupation_survives_bucketing():
+    ticks = [{"T1": "A"} for _ in range(100)]
+    ticks[57] = {"T1": "A", "T2": "AB"}
+    graph = make_graph(ticks)
+
+    occupancy = graph.get_occupancy(max_columns=10)
+
+    assert len(occupancy["times"]) == 10
+    assert occupancy["matrix"][1] == [[]] * 5 + [["T2"]] + [[]] * 4
+
+def test_occupancy_levels_match_raw_rows():
+    rng = random.Random(1)
+    ticks = [{f"T{i}": rng.choice(["A", "AB", "B"]) for i in range(3) if rng.random() < 0.5} for _ in range(777)]
+    graph = make_graph(ticks)
+
+    start, end = START + timedelta(minutes=13), START + timedelta(minutes=700)
+    occupancy = graph.get_occupancy(start, end, max_columns=37)
+
+    lo, hi = 13, 701
+    for b, time in enumerate(occupancy["times"]):
+        bucket_lo = lo + b * (hi - lo) // 37
+        bucket_hi = lo + (b + 1) * (hi - lo) // 37
+        assert time == (START + timedelta(minutes=bucket_lo)).isoformat()
+        for i, section in enumerate(["A", "AB", "B"]):
+            expected = sorted({t for tick in ticks[bucket_lo:bucket_hi] for t, s in tick.items() if s == section})
+            assert occupancy["matrix"][i][b] == expected
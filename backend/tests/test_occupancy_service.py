@@ -0,0 +1,177 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta
+from services.occupancy_service import OccupancyService, ReservationTable
+from services.simulation_service import SimulationService
+from services.conflict_detection_service import ConflictDetectionService
+
+SCENARIO = {
+    "network": {
+        "sections": [
+            {"id": "A", "type": "station", "tracks": ["main", "loop"]},
+            {"id": "AB", "type": "single_track", "tracks": ["main"]},
+            {"id": "B", "type": "station", "tracks": ["main", "loop"]}
+        ],
+        "distances": {"A-AB": 0, "AB-B": 10},
+        "signals": [
+            {"id": "S1", "location": "A", "type": "departure"},
+            {"id": "S2", "location": "AB", "type": "block"},
+            {"id": "S3", "location": "B", "type": "arrival"}
+        ]
+    },
+    "timetable": {
+        "trains": [
+            {
+                "id": "T1",
+                "route": ["A", "AB", "B"],
+                "schedule": {
+                    "A": {"arrival": "09:00", "departure": "09:00"},
+                    "AB": {"arrival": "09:01", "departure": "09:01"},
+                    "B": {"arrival": "09:11", "departure": "09:20"}
+                }
+            },
+            {
+                "id": "T2",
+                "route": ["A", "AB", "B"],
+                "schedule": {
+                    "A": {"arrival": "09:01", "departure": "09:01"},
+                    "AB": {"arrival": "09:02", "departure": "09:02"},
+                    "B": {"arrival": "09:12", "departure": "09:30"}
+                }
+            }
+        ]
+    },
+    "disruption": {"disruptions": []}
+}
+
+def run_ticks(simulation: SimulationService, minutes: int) -> dict:
+    """Advance the simulation minute by minute, recording when each train enters each section"""
+    entries = {}
+
+    async def run():
+        for _ in range(minutes):
+            simulation.current_time += timedelta(minutes=1)
+            await simulation.update_train_positions()
+            for train in simulation.trains.values():
+                entries.setdefault((train.id, train.current_section), simulation.current_time)
+
+    asyncio.run(run())
+    return entries
+
+def make_simulation(scenario: dict = SCENARIO) -> SimulationService:
+    simulation = SimulationService()
+    simulation.set_occupancy_service(OccupancyService())
+    asyncio.run(simulation.initialize(scenario))
+    simulation.current_time = simulation.scenario_start_time()
+    return simulation
+
+def test_following_train_is_held_by_headway():
+    simulation = make_simulation()
+    start = simulation.current_time
+
+    entries = run_ticks(simulation, 40)
+
+    # T1 enters AB at 09:01 and needs 10 minutes to reach B; AB then stays
+    # protected for the 3 minute block headway, so T2 cannot enter before 09:14
+    assert entries[("T1", "AB")] == start + timedelta(minutes=1)
+    assert entries[("T1", "B")] == start + timedelta(minutes=11)
+    assert entries[("T2", "AB")] == start + timedelta(minutes=14)
+    assert simulation.trains["T2"].delay == 12
+
+def test_block_snapshot_shows_occupant_while_follower_waits():
+    simulation = make_simulation()
+    run_ticks(simulation, 5)
+
+    snapshot = simulation.occupancy_service.get_occupancy_snapshot(simulation.current_time)
+    assert snapshot["AB"]["main"] == "T1"
+    assert simulation.trains["T2"].current_section == "A"
+
+def test_completed_train_releases_final_block():
+    simulation = make_simulation()
+    run_ticks(simulation, 90)
+
+    assert all(train.status == "completed" for train in simulation.trains.values())
+    assert simulation.occupancy_service.positions == {}
+    later = simulation.current_time + timedelta(minutes=10)
+    assert simulation.occupancy_service.block_wait("B", later) == timedelta(0)
+
+def test_reservations_are_kept_per_visit():
+    table = ReservationTable()
+    day = datetime(2025, 1, 1, 9, 0)
+
+    assert table.reserve("T1", day, day + timedelta(minutes=5), visit=0) is None
+    assert table.reserve("T1", day + timedelta(minutes=30), day + timedelta(minutes=35), visit=4) is None
+    blocking = table.reserve("T2", day + timedelta(minutes=2), day + timedelta(minutes=4))
+
+    assert blocking.train_id == "T1"
+    assert table.occupant_at(day + timedelta(minutes=32)).visit == 4
+    table.prune(day + timedelta(minutes=10))
+    assert table.occupant_at(day + timedelta(minutes=1)) is None
+    assert table.occupant_at(day + timedelta(minutes=31)).train_id == "T1"
+
+def test_origin_block_is_booked_from_scheduled_arrival():
+    simulation = make_simulation()
+    start = simulation.current_time
+
+    _, track, entry_time, _ = simulation.occupancy_service.positions["T2"]
+    assert entry_time == start + timedelta(minutes=1)
+    assert simulation.occupancy_service.blocks["A"].tables[track].occupant_at(start) is None
+
+def test_train_without_origin_track_waits_for_one():
+    scenario = copy.deepcopy(SCENARIO)
+    scenario["timetable"]["trains"].append({
+        "id": "T3",
+        "route": ["A", "AB", "B"],
+        "schedule": {
+            "A": {"arrival": "09:00", "departure": "09:03"},
+            "AB": {"arrival": "09:04", "departure": "09:04"},
+            "B": {"arrival": "09:14", "departure": "09:40"}
+        }
+    })
+    simulation = make_simulation(scenario)
+    assert "T3" not in simulation.occupancy_service.positions
+
+    entries = run_ticks(simulation, 120)
+
+    # T1 leaves A at 09:01, so the main track is free again after the 2 minute headway
+    start = simulation.scenario_start_time()
+    assert entries[("T3", "AB")] > entries[("T2", "AB")] >= start + timedelta(minutes=3)
+    assert all(train.status == "completed" for train in simulation.trains.values())
+    assert simulation.occupancy_service.positions == {}
+
+def test_disruption_on_completed_train_is_ignored():
+    simulation = make_simulation()
+    run_ticks(simulation, 90)
+
+    asyncio.run(simulation.apply_disruption(
+        {"id": "D1", "type": "delay", "train_id": "T1", "location": "A", "delay_minutes": 10, "inject_at": "09:05"}
+    ))
+    run_ticks(simulation, 5)
+
+    assert simulation.trains["T1"].status == "completed"
+    assert simulation.trains["T1"].delay == 0
+
+def test_detection_sees_train_already_in_block():
+    scenario = copy.deepcopy(SCENARIO)
+    scenario["timetable"]["trains"] = [scenario["timetable"]["trains"][0], {
+        "id": "T3",
+        "route": ["B", "AB", "A"],
+        "schedule": {
+            "B": {"arrival": "09:00", "departure": "09:04"},
+            "AB": {"arrival": "09:05", "departure": "09:05"},
+            "A": {"arrival": "09:15", "departure": "09:20"}
+        }
+    }]
+    simulation = make_simulation(scenario)
+    run_ticks(simulation, 3)
+    conflict_service = ConflictDetectionService()
+    conflict_service.set_occupancy_service(simulation.occupancy_service)
+
+    # T1 holds single-track AB until 09:11 plus headway; T3 is due in head-on at 09:05
+    conflicts = asyncio.run(conflict_service.detect_conflicts(
+        simulation.trains, simulation.network_data, simulation.current_time
+    ))
+
+    assert [(c.train1_id, c.train2_id, c.location, c.conflict_type) for c in conflicts] == [
+        ("T1", "T3", "AB", "head_on")
+    ]
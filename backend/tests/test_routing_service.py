@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from services.occupancy_service import OccupancyService
+from services.routing_service import RoutingService
+
+# Meshed network: two parallel lines joined by a crossover B-C, plus a long way round via D
+NETWORK = {
+    "sections": [{"id": section_id} for section_id in ["A", "B", "C", "D", "E"]],
+    "distances": {"A-B": 10, "B-E": 10, "A-C": 5, "C-E": 20, "A-D": 30, "D-E": 5},
+    "connections": [{"from": "B", "to": "C"}],
+    "signals": [{"id": "S1", "location": "B", "type": "block"}]
+}
+
+DEPARTURE = datetime(2025, 1, 1, 9, 0)
+
+def make_routing():
+    occupancy_service = OccupancyService()
+    occupancy_service.build_from_network(NETWORK)
+    routing_service = RoutingService()
+    routing_service.set_occupancy_service(occupancy_service)
+    routing_service.build_from_network(NETWORK)
+    return occupancy_service, routing_service
+
+def test_k_shortest_paths_are_ordered_and_loopless():
+    _, routing_service = make_routing()
+
+    routes = routing_service.get_routes("A", "E", DEPARTURE, 6)
+
+    # The crossover has no distance, so it costs the 1 minute minimum running time
+    assert [(route.sections, route.travel_minutes) for route in routes] == [
+        (["A", "C", "B", "E"], 16),
+        (["A", "B", "E"], 20),
+        (["A", "C", "E"], 25),
+        (["A", "B", "C", "E"], 31),
+        (["A", "D", "E"], 35)
+    ]
+    assert all(len(set(route.sections)) == len(route.sections) for route in routes)
+
+def test_routes_are_cached_per_time_bucket():
+    _, routing_service = make_routing()
+
+    routes = routing_service.get_routes("A", "E", DEPARTURE, 3)
+
+    assert routing_service.get_routes("A", "E", DEPARTURE + timedelta(minutes=2), 2) == routes[:2]
+    assert routing_service.get_routes("A", "E", DEPARTURE + timedelta(minutes=2), 2)[0] is routes[0]
+    later = routing_service.get_routes("A", "E", DEPARTURE + timedelta(minutes=10), 3)
+    assert later[0] is not routes[0]
+
+def test_occupancy_change_invalidates_cached_routes():
+    occupancy_service, routing_service = make_routing()
+    assert routing_service.get_routes("A", "E", DEPARTURE, 1)[0].sections == ["A", "C", "B", "E"]
+
+    # A train stopping in B has no known exit time, so B costs the open occupation penalty
+    assert occupancy_service.enter_block("T9", "B", DEPARTURE)
+    routes = routing_service.get_routes("A", "E", DEPARTURE, 2)
+
+    assert [(route.sections, route.travel_minutes) for route in routes] == [
+        (["A", "C", "E"], 25),
+        (["A", "C", "B", "E"], 26)
+    ]
@@ -0,0 +1,57 @@
+import asyncio
+import time
+import pytest
+from services.network_topology import NetworkTopology
+from services.session_service import SessionManager
+from tests.test_occupancy_service import SCENARIO, run_ticks
+
+def make_manager() -> SessionManager:
+    manager = SessionManager()
+    manager.scenario_data = {**SCENARIO, "topology": NetworkTopology(SCENARIO["network"])}
+    return manager
+
+def test_sessions_share_topology_but_not_reservations():
+    manager = make_manager()
+    first = asyncio.run(manager.open_session("first"))
+    second = asyncio.run(manager.open_session("second"))
+
+    assert first.occupancy_service.topology is second.occupancy_service.topology
+    assert first.routing_service.graph is second.routing_service.graph
+
+    first.simulation_service.current_time = first.simulation_service.scenario_start_time()
+    run_ticks(first.simulation_service, 5)
+    snapshot = second.occupancy_service.get_occupancy_snapshot(first.simulation_service.current_time)
+    assert snapshot["AB"]["main"] is None
+
+def test_start_is_refused_once_cpu_budget_is_spent():
+    manager = make_manager()
+    session = asyncio.run(manager.open_session())
+    session.simulation_service.cpu_seconds_used = manager.max_cpu_seconds_per_session
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(session.simulation_service.start_simulation())
+    assert not session.simulation_service.is_running()
+
+def test_cpu_of_other_tasks_during_broadcast_is_not_charged():
+    manager = make_manager()
+    session = asyncio.run(manager.open_session())
+    simulation = session.simulation_service
+
+    class SlowSocket:
+        async def send_text(self, message):
+            await asyncio.sleep(0.01)
+
+    def busy_work():
+        end = time.process_time() + 0.2
+        while time.process_time() < end:
+            pass
+
+    async def run():
+        session.websocket_manager.active_connections.append(SlowSocket())
+        # Stands in for another session's tick running while this broadcast waits on the socket
+        asyncio.get_running_loop().call_soon(busy_work)
+        await simulation.broadcast_simulation_state()
+
+    used_before = simulation.cpu_seconds_used
+    asyncio.run(run())
+    assert simulation.cpu_seconds_used - used_before < 0.1
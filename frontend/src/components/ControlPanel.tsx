@@ -45,7 +45,9 @@ const ControlPanel: React.FC<Props> = ({
   onClearAlerts
 }) => {
   const formatResolutionText = (resolution: Resolution): string => {
-    if (resolution.solution_type === "reroute") {
+    if (resolution.solution_type === "reroute" && resolution.details.route) {
+      return `Reroute train ${resolution.details.rerouted_train} via ${resolution.details.route.join(" → ")} to avoid ${resolution.details.location}. Estimated delay: ${resolution.details.estimated_delay} minutes.`;
+    } else if (resolution.solution_type === "reroute") {
       return `Reroute train ${resolution.details.rerouted_train} from ${resolution.details.from_track} to ${resolution.details.to_track} line at ${resolution.details.location}. Estimated delay: ${resolution.details.estimated_delay} minutes.`;
     } else if (resolution.solution_type === "delay") {
       return `Delay train ${resolution.details.delayed_train} by ${resolution.details.delay_minutes} minutes at ${resolution.details.location}.`;
@@ -158,8 +158,8 @@ const TrackOccupancyGraph: React.FC<Props> = ({ simulationState, resolution }) =
         .text(block.train);
     });
 
-    // Draw proposed changes (orange blocks)
-    if (resolution && resolution.solution_type === "reroute") {
+    // Draw proposed changes (orange blocks); path reroutes have no track change to show
+    if (resolution && resolution.solution_type === "reroute" && resolution.details.to_track) {
       const rerouting = resolution.details;
       
       // Find the original block that's being rerouted